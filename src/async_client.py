@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import json
+import time
+import httpx
+
+from client import QuickbooksClient, QuickBooksClientException, BOOK_CLOSE_DATE_QUERY
+
+# QuickBooks Online allows 10 concurrent requests per company
+DEFAULT_MAX_CONCURRENT_REQUESTS = 10
+# Throttled requests (more than 500 requests per minute per company) are retried with exponential backoff
+MAX_THROTTLED_RETRIES = 6
+THROTTLE_BACKOFF_SECONDS = 2
+
+
+class AsyncQuickbooksClient(QuickbooksClient):
+    """
+    QuickBooks Requests Handler with asyncio backend
+    Requests are sent over a pooled HTTP/2 connection, the pages of an entity and different endpoints
+    are fetched concurrently. Must be used as an async context manager around the fetch_async() calls.
+    """
+
+    def __init__(
+        self,
+        company_id,
+        access_token,
+        refresh_token,
+        oauth,
+        sandbox,
+        pagination="offset",
+        max_concurrent_requests=DEFAULT_MAX_CONCURRENT_REQUESTS,
+    ):
+        super().__init__(company_id, access_token, refresh_token, oauth, sandbox, pagination)
+        self.max_concurrent_requests = max_concurrent_requests
+        self.http = None
+        self.semaphore = None
+        self.refresh_lock = None
+        self.book_close_date_lock = None
+        self.throttled_until = 0  # monotonic time until which no request is sent after throttling
+
+    async def __aenter__(self):
+        self.http = httpx.AsyncClient(
+            http2=True,
+            headers={"Accept": "application/json", "Accept-Encoding": "gzip"},
+            limits=httpx.Limits(
+                max_connections=self.max_concurrent_requests,
+                max_keepalive_connections=self.max_concurrent_requests,
+                keepalive_expiry=60,
+            ),
+            timeout=httpx.Timeout(120, connect=30),
+        )
+        self.semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        self.refresh_lock = asyncio.Lock()
+        self.book_close_date_lock = asyncio.Lock()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.http.aclose()
+        self.http = None
+
+    async def _request_async(self, url, params=None, stats=None):
+        """
+        Handles Request
+        stats - dict receiving the size in bytes and the duration in seconds of the response
+        """
+        throttled = 0
+        while True:
+            await self.wait_for_throttling()
+            access_token = self.access_token
+            headers = {"Authorization": "Bearer " + access_token}
+            logging.info(f"Requesting: {url} with params: {params}")
+            async with self.semaphore:
+                start = time.monotonic()
+                data = await self.http.get(url, headers=headers, params=params)
+                seconds = time.monotonic() - start
+
+            if self.is_throttled(data):
+                throttled += 1
+                if throttled > MAX_THROTTLED_RETRIES:
+                    raise QuickBooksClientException(f"Requests are still throttled by QuickBooks: {data.text}")
+                self.throttle(data, throttled)
+                continue
+
+            try:
+                results = json.loads(data.content)
+            except json.decoder.JSONDecodeError as e:
+                raise QuickBooksClientException(f"Cannot decode response: {data.text}") from e
+
+            if "fault" not in results and "Fault" not in results:
+                break
+
+            async with self.refresh_lock:
+                # Token might have been refreshed by a concurrent request in the meantime
+                if access_token != self.access_token:
+                    continue
+                if self.access_token_refreshed:
+                    logging.error("Response Headers: {}".format(data.headers))
+                    raise QuickBooksClientException(data.text)
+                logging.info("Refreshing Access Token")
+                await asyncio.to_thread(self.refresh_access_token)
+
+        if stats is not None:
+            stats.update(bytes=len(data.content), seconds=seconds)
+        if not results:
+            raise QuickBooksClientException("Unable to fetch results.")
+        return results
+
+    @staticmethod
+    def is_throttled(response):
+        """
+        QuickBooks answers requests over the rate limit with HTTP 429 and a ThrottleExceeded fault
+        """
+        return response.status_code == 429 or (response.is_error and "ThrottleExceeded" in response.text)
+
+    def throttle(self, response, attempt):
+        """
+        Pausing all requests after a throttled response, for Retry-After seconds if sent by QuickBooks
+        """
+        try:
+            delay = float(response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            delay = THROTTLE_BACKOFF_SECONDS * 2 ** (attempt - 1)
+        logging.warning(f"Requests are throttled by QuickBooks, retrying in {delay} seconds.")
+        self.throttled_until = max(self.throttled_until, time.monotonic() + delay)
+
+    async def wait_for_throttling(self):
+        """
+        Waiting until the pause after a throttled response is over, before the request takes a slot of the semaphore
+        """
+        delay = self.throttled_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _query_async(self, query, stats=None):
+        """
+        Sending the query and returning its QueryResponse
+        """
+        logging.info("Request Query: {0}".format(query))
+        url = "{0}/{1}/query?query={2}".format(self.base_url, self.company_id, self.url_encode(query))
+        results = await self._request_async(url, stats=stats)
+        return results["QueryResponse"]
+
+    async def _page_async(self, endpoint, query, page_size):
+        """
+        Fetching one page of entity records and updating the page size of the entity with it
+        """
+        stats = {}
+        page = (await self._query_async(query, stats=stats)).get(endpoint, [])
+        self.observe_page(endpoint, page_size, len(page), stats)
+        return page
+
+    async def fetch_async(self, endpoint, report_api_bool, start_date, end_date, query="", params=None):
+        """
+        Fetching results for the specified endpoint
+        Unlike fetch(), the results are returned as (data, data_2) and not stored in the client,
+        so several endpoints can be fetched at the same time.
+        """
+        if report_api_bool:
+            logging.info("Processing Report: {0}".format(endpoint))
+            if endpoint == "CustomQuery":
+                if query == "":
+                    raise QuickBooksClientException("Please enter query for CustomQuery. Exit...")
+                return await self._query_async(query), []
+
+            if not (start_date and end_date):
+                raise QuickBooksClientException(f"Start date and End date are required for {endpoint} reports.")
+            return await self.report_request_async(endpoint, start_date, end_date, params)
+
+        if endpoint in self.prefetched:
+            data = self.prefetched.pop(endpoint)
+            logging.info("Total Number of Records for {0}: {1} (batch request)".format(endpoint, len(data)))
+            return data, []
+
+        self.seen_ids[endpoint] = set()
+        self.duplicates[endpoint] = 0
+        if self.pagination == "keyset" and endpoint not in self.singleton_entities:
+            data = await self.keyset_request_async(endpoint)
+        else:
+            data = await self.data_request_async(endpoint)
+        self.finish_deduplication(endpoint)
+        return data, []
+
+    async def data_request_async(self, endpoint):
+        """
+        Handles Pagination with STARTPOSITION, all pages are requested concurrently
+        The page size is chosen before the pages are requested, the observed pages are used by the next run.
+        """
+        maxresults = self.get_page_size(endpoint)
+        count = (await self._query_async("select count(*) from {0}".format(endpoint)))["totalCount"]
+        logging.info("Total Number of Records for {0}: {1}".format(endpoint, count))
+
+        pages = await asyncio.gather(
+            *[
+                self._page_async(endpoint, self.offset_query(endpoint, startposition, maxresults), maxresults)
+                for startposition in range(1, count + 1, maxresults)
+            ]
+        )
+        logging.info("Number of Requests: {0}".format(len(pages)))
+
+        data = []
+        for page in pages:
+            data.extend(self.drop_duplicates(endpoint, page))
+        return data
+
+    async def keyset_request_async(self, endpoint):
+        """
+        Handles keyset Pagination, pages of one entity are requested one after another
+        """
+        maxresults = self.get_page_size(endpoint)
+        data = []
+        last_id = None
+        while True:
+            page = await self._page_async(endpoint, self.keyset_query(endpoint, last_id, maxresults), maxresults)
+            data.extend(self.drop_duplicates(endpoint, page))
+            if len(page) < maxresults:
+                break
+            last_id = page[-1]["Id"]
+            maxresults = self.get_page_size(endpoint)
+
+        logging.info("Total Number of Records for {0}: {1}".format(endpoint, len(data)))
+        return data
+
+    async def load_book_close_date_async(self):
+        """
+        Fetching the books closing date once without blocking the event loop
+        """
+        async with self.book_close_date_lock:
+            if self.book_close_date is None:
+                self.set_book_close_date(await self._query_async(BOOK_CLOSE_DATE_QUERY))
+
+    async def report_request_async(self, endpoint, start_date, end_date, params=None):
+        """
+        API request for Report Endpoint, accrual and cash reports are requested concurrently
+        """
+        urls, enddate = self.report_urls(endpoint, start_date, end_date, self.report_columns.get(endpoint))
+        if self.report_cache is not None:
+            # the report cache needs the books closing date, it must not be fetched by a blocking request
+            await self.load_book_close_date_async()
+
+        async def report(url):
+            results, key = self.get_cached_report(url, params, enddate)
+            if results is None:
+                results = await self._request_async(url, params)
+                self.cache_report(key, enddate, results)
+            return results
+
+        results = await asyncio.gather(*[report(url) for url in urls])
+        return results[0], results[1] if len(results) > 1 else []
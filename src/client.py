@@ -1,5 +1,10 @@
 import logging
 import json
+import base64
+import datetime
+import hashlib
+import time
+import zlib
 import dateparser
 import urllib.parse as url_parse
 import requests
@@ -9,8 +14,40 @@ import backoff
 from keboola.component.base import ComponentBase  # noqa
 from typing import Tuple
 
+from page_size import PageSizeController, MAX_PAGE_SIZE
+
 requesting = requests.Session()
 
+# Maximum number of queries in one batch request
+MAX_BATCH_SIZE = 30
+
+# Query of the company preferences holding the books closing date
+BOOK_CLOSE_DATE_QUERY = "SELECT * FROM Preferences"
+
+# Columns which can be selected with the columns parameter of the detail reports
+REPORT_COLUMNS = {
+    "GeneralLedger": [
+        "klass_name", "account_name", "account_num", "chk_print_state", "create_by", "create_date", "cust_name",
+        "doc_num", "emp_name", "inv_date", "is_adj", "is_ap_paid", "is_ar_paid", "is_cleared", "item_name",
+        "last_mod_by", "last_mod_date", "memo", "name", "quantity", "rate", "split_acc", "tx_date", "txn_type",
+        "vend_name", "net_amount", "tax_amount", "tax_code", "dept_name", "subt_nat_amount", "rbal_nat_amount",
+        "debt_amt", "credit_amt",
+    ],
+    "ProfitAndLossDetail": [
+        "create_by", "create_date", "doc_num", "last_mod_by", "last_mod_date", "memo", "name", "pmt_mthd",
+        "split_acc", "tx_date", "txn_type", "klass_name", "dept_name", "debt_amt", "credit_amt", "nat_open_bal",
+        "subt_nat_amount", "tax_amount", "tax_code", "net_amount", "rbal_nat_amount",
+    ],
+    "TransactionList": [
+        "account_name", "create_by", "create_date", "cust_msg", "due_date", "doc_num", "inv_date", "is_ap_paid",
+        "is_cleared", "is_no_post", "last_mod_by", "memo", "name", "other_account", "pmt_mthd", "printed",
+        "sales_cust1", "sales_cust2", "sales_cust3", "term_name", "tracking_num", "tx_date", "txn_type",
+        "subt_nat_amount",
+    ],
+}
+# Columns requested when no columns are selected for the report, other reports return their default columns
+DEFAULT_REPORT_COLUMNS = {"GeneralLedger": REPORT_COLUMNS["GeneralLedger"]}
+
 
 class QuickBooksClientException(Exception):
     pass
@@ -21,7 +58,10 @@ class QuickbooksClient:
     QuickBooks Requests Handler
     """
 
-    def __init__(self, company_id, access_token, refresh_token, oauth, sandbox):
+    def __init__(self, company_id, access_token, refresh_token, oauth, sandbox, pagination="offset"):
+        self.last_id = None
+        self.startposition = 1
+        self.on_page = None
         self.data_2 = None
         self.data = None
         self.app_key = oauth.appKey
@@ -38,6 +78,20 @@ class QuickbooksClient:
         self.access_token_refreshed = False
         self.new_refresh_token = False
         self.company_id = company_id
+        self.pagination = pagination
+        self.prefetched = {}  # records of entities already fetched by batch requests
+        self.report_cache = None  # cached report results by request, enabled by enable_report_cache()
+        self.report_cache_ttl = 0
+        self.report_cache_used = set()
+        self.report_columns = {}  # {report: selected columns} validated against REPORT_COLUMNS
+        self.page_sizes = None  # adaptive page sizes by entity, enabled by enable_adaptive_page_size()
+        self.seen_ids = {}  # {endpoint: Ids of the records fetched by this run}, see drop_duplicates()
+        self.duplicates = {}  # {endpoint: number of dropped duplicate records}
+        self.book_close_date = None
+        # Small reference entities which are fetched together with batch requests
+        self.batch_entities = ["Account", "Class", "Department", "Preferences", "TaxCode", "TaxRate", "Term"]
+        # Entities with a single record, they cannot be ordered, counted or paginated by keyset
+        self.singleton_entities = ["Preferences"]
         self.reports_required_accounting_type = [
             "ProfitAndLoss",
             "ProfitAndLossDetail",
@@ -45,6 +99,57 @@ class QuickbooksClient:
             "BalanceSheet",
             "TrialBalance",
         ]
+        self.reports_supporting_summarize_column_by = [
+            "ProfitAndLoss",
+            "BalanceSheet",
+            "CashFlow",
+        ]
+
+    def get_progress(self):
+        """
+        Returns the pagination position following the last fetched page of the current entity
+        """
+        if self.last_id is not None:
+            return {"last_id": self.last_id}
+        return {"startposition": self.startposition}
+
+    def enable_report_cache(self, cache, ttl_hours=0):
+        """
+        Enables caching of report results
+        cache       - report cache saved by the previous run
+        ttl_hours   - reports of periods which are not closed are reused for ttl_hours, 0 disables it
+        """
+        self.report_cache = cache
+        self.report_cache_ttl = ttl_hours
+
+    def enable_adaptive_page_size(self, sizes=None):
+        """
+        Enables choosing the page size of every entity from the observed responses
+        sizes - page sizes chosen by the previous run
+        """
+        self.page_sizes = PageSizeController(sizes)
+
+    def get_page_size(self, endpoint):
+        """
+        Returns the page size of the next page of the entity
+        """
+        if self.page_sizes is None:
+            return MAX_PAGE_SIZE
+        return self.page_sizes.get(endpoint)
+
+    def observe_page(self, endpoint, page_size, records, stats):
+        """
+        Updates the page size of the entity with the stats of a fetched page, returns the next page size
+        """
+        if self.page_sizes is None:
+            return page_size
+        return self.page_sizes.observe(endpoint, page_size, records, stats["bytes"], stats["seconds"])
+
+    def get_report_cache(self):
+        """
+        Returns the report cache entries used by this run
+        """
+        return {key: entry for key, entry in self.report_cache.items() if key in self.report_cache_used}
 
     def get_new_refresh_token(self) -> Tuple[str, str]:
         try:
@@ -54,17 +159,24 @@ class QuickbooksClient:
 
         return self.refresh_token, self.access_token
 
-    def fetch(self, endpoint, report_api_bool, start_date, end_date, query="", params=None):
+    def fetch(
+        self, endpoint, report_api_bool, start_date, end_date, query="", params=None, resume=None, on_page=None
+    ):
         """
         Fetching results for the specified endpoint
+        resume  - pagination position returned by get_progress() to continue an interrupted entity extraction
+        on_page - callback receiving every fetched page of entity records, the pages are not kept in data
         """
+        resume = resume or {}
+        self.on_page = on_page
         # Initializing Parameters
         self.endpoint = endpoint
         self.report_api_bool = report_api_bool
 
         # Pagination Parameters
-        self.startposition = 1
-        self.maxresults = 1000
+        self.startposition = resume.get("startposition", 1)
+        self.last_id = resume.get("last_id")
+        self.maxresults = self.get_page_size(endpoint)
         # Start_date will be used as the custom query input field
         # if custom query is selected
         self.start_date = start_date
@@ -76,6 +188,8 @@ class QuickbooksClient:
         # data2 = Cash Type
         self.data = []  # stores all the returns from request
         self.data_2 = []
+        self.seen_ids[endpoint] = set()
+        self.duplicates[endpoint] = 0
 
         logging.info("Accessing QuickBooks API...")
         if report_api_bool:
@@ -89,6 +203,12 @@ class QuickbooksClient:
                 if not (self.start_date and self.end_date):
                     raise QuickBooksClientException(f"Start date and End date are required for {endpoint} reports.")
                 self.report_request(endpoint, start_date, end_date, params)
+        elif endpoint in self.prefetched:
+            data = self.prefetched.pop(endpoint)
+            logging.info("Total Number of Records for {0}: {1} (batch request)".format(endpoint, len(data)))
+            self.add_page(data)
+        elif self.pagination == "keyset" and endpoint not in self.singleton_entities:
+            self.keyset_request()
         else:
             self.count = self.get_count()  # total count of records for pagination
             if self.count == 0:
@@ -97,6 +217,9 @@ class QuickbooksClient:
             else:
                 self.data_request()
 
+        if not report_api_bool:
+            self.finish_deduplication(endpoint)
+
     @backoff.on_exception(backoff.expo, HTTPError, max_tries=3)
     def refresh_access_token(self):
         """
@@ -108,7 +231,7 @@ class QuickbooksClient:
         url = "https://oauth.platform.intuit.com/oauth2/v1/tokens/bearer"
         param = {"grant_type": "refresh_token", "refresh_token": self.refresh_token}
 
-        r = requests.post(url, auth=HTTPBasicAuth(self.app_key, self.app_secret), data=param)
+        r = requesting.post(url, auth=HTTPBasicAuth(self.app_key, self.app_secret), data=param)
         r.raise_for_status()
 
         results = r.json()
@@ -149,16 +272,22 @@ class QuickbooksClient:
         out = url_parse.quote_plus(query)
         return out
 
-    def _request(self, url, params=None):
+    def _request(self, url, params=None, payload=None, stats=None):
         """
         Handles Request
+        payload - JSON body, the request is sent as POST if specified
+        stats   - dict receiving the size in bytes and the duration in seconds of the response
         """
         results = None
         request_success = False
         while not request_success:
             headers = {"Authorization": "Bearer " + self.access_token, "Accept": "application/json"}
             logging.info(f"Requesting: {url} with params: {params}")
-            data = requesting.get(url, headers=headers, params=params)
+            start = time.monotonic()
+            if payload is None:
+                data = requesting.get(url, headers=headers, params=params)
+            else:
+                data = requesting.post(url, headers=headers, params=params, json=payload)
 
             try:
                 results = json.loads(data.text)
@@ -176,10 +305,125 @@ class QuickbooksClient:
             else:
                 request_success = True
 
+        if stats is not None:
+            stats.update(bytes=len(data.content), seconds=time.monotonic() - start)
         if not results:
             raise QuickBooksClientException("Unable to fetch results.")
         return results
 
+    def batch_request(self, queries):
+        """
+        Sending queries with batch requests of up to MAX_BATCH_SIZE queries
+        queries - list of (batch item id, query) tuples
+        Returns QueryResponse of every query by the batch item id
+        """
+
+        url = "{0}/{1}/batch".format(self.base_url, self.company_id)
+        responses = {}
+
+        for i in range(0, len(queries), MAX_BATCH_SIZE):
+            items = [{"bId": bid, "Query": query} for bid, query in queries[i:i + MAX_BATCH_SIZE]]
+
+            logging.info("Batch Request: {0}".format(", ".join(item["bId"] for item in items)))
+            results = self._request(url, payload={"BatchItemRequest": items})
+
+            for item in results["BatchItemResponse"]:
+                if "Fault" in item:
+                    raise QuickBooksClientException(
+                        "Batch request for {0} failed: {1}".format(item["bId"], json.dumps(item["Fault"]))
+                    )
+                responses[item["bId"]] = item["QueryResponse"]
+
+        return responses
+
+    def prefetch(self, endpoints):
+        """
+        Fetching the first page of all small entities with batch requests
+        Entities returning a full page are left to the regular pagination in fetch()
+        """
+
+        self.maxresults = 1000
+        queries = []
+        for endpoint in endpoints:
+            if endpoint not in self.batch_entities:
+                continue
+            if endpoint in self.singleton_entities:
+                query = "SELECT * FROM {0}".format(endpoint)
+            elif endpoint == "Class":
+                query = "SELECT * FROM Class WHERE Active IN (true, false) MAXRESULTS {0}".format(self.maxresults)
+            else:
+                query = "SELECT * FROM {0} MAXRESULTS {1}".format(endpoint, self.maxresults)
+            queries.append((endpoint, query))
+
+        for endpoint, response in self.batch_request(queries).items():
+            data = response.get(endpoint, [])
+            if endpoint not in self.singleton_entities and len(data) >= self.maxresults:
+                logging.info("{0} does not fit into one page, it will be paginated.".format(endpoint))
+                continue
+            self.prefetched[endpoint] = data
+
+    def probe(self, endpoints):
+        """
+        Fetching the number of records and the last update time of the entities with batch requests
+        Returns {endpoint: {"count": ..., "last_updated": ...}}, singleton entities are not probed
+        """
+
+        queries = []
+        for endpoint in endpoints:
+            if endpoint in self.singleton_entities:
+                continue
+            # Custom condition for Class endpoint
+            where = " WHERE Active IN (true, false)" if endpoint == "Class" else ""
+            queries.append(("{0}-count".format(endpoint), "SELECT COUNT(*) FROM {0}{1}".format(endpoint, where)))
+            queries.append(
+                (
+                    "{0}-last_updated".format(endpoint),
+                    "SELECT * FROM {0}{1} ORDERBY MetaData.LastUpdatedTime DESC MAXRESULTS 1".format(endpoint, where),
+                )
+            )
+
+        responses = self.batch_request(queries)
+
+        probes = {}
+        for endpoint in endpoints:
+            if endpoint in self.singleton_entities:
+                continue
+            last_record = responses["{0}-last_updated".format(endpoint)].get(endpoint, [])
+            probes[endpoint] = {
+                "count": responses["{0}-count".format(endpoint)].get("totalCount", 0),
+                "last_updated": last_record[0]["MetaData"]["LastUpdatedTime"] if last_record else None,
+            }
+
+        return probes
+
+    @staticmethod
+    def offset_query(endpoint, startposition, maxresults):
+        """
+        Query for one page of the entity paginated with STARTPOSITION
+        """
+        # Custom query for Class endpoint
+        if endpoint == "Class":
+            return "SELECT * FROM {0} WHERE Active IN (true, false) STARTPOSITION {1} MAXRESULTS {2}".format(
+                endpoint, startposition, maxresults
+            )
+
+        return "SELECT * FROM {0} STARTPOSITION {1} MAXRESULTS {2}".format(endpoint, startposition, maxresults)
+
+    @staticmethod
+    def keyset_query(endpoint, last_id, maxresults):
+        """
+        Query for one page of the entity ordered by Id following the last_id
+        """
+        conditions = []
+        # Custom condition for Class endpoint
+        if endpoint == "Class":
+            conditions.append("Active IN (true, false)")
+        if last_id is not None:
+            conditions.append("Id > '{0}'".format(last_id))
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+
+        return "SELECT * FROM {0}{1} ORDERBY Id MAXRESULTS {2}".format(endpoint, where, maxresults)
+
     def data_request(self):
         """
         Handles Request Parameters and Pagination
@@ -189,23 +433,15 @@ class QuickbooksClient:
 
         while self.startposition <= self.count:
             # Query Parameters
-            # Custom query for Class endpoint
-            if self.endpoint == "Class":
-                query = "SELECT * FROM {0} WHERE Active IN (true, false) STARTPOSITION {1} MAXRESULTS {2}".format(
-                    self.endpoint, self.startposition, self.maxresults
-                )
-
-            else:
-                query = "SELECT * FROM {0} STARTPOSITION {1} MAXRESULTS {2}".format(
-                    self.endpoint, self.startposition, self.maxresults
-                )
+            query = self.offset_query(self.endpoint, self.startposition, self.maxresults)
 
             logging.info("Request Query: {0}".format(query))
             encoded_query = self.url_encode(query)
             url = "{0}/{1}/query?query={2}".format(self.base_url, self.company_id, encoded_query)
 
             # Requests and concatenating results into class's data variable
-            results = self._request(url)
+            stats = {}
+            results = self._request(url, stats=stats)
 
             # If API returns error, raise exception and terminate application
             if "fault" in results or "Fault" in results:
@@ -214,14 +450,96 @@ class QuickbooksClient:
             data = results["QueryResponse"][self.endpoint]
 
             # Concatenate with exist extracted data
-            self.data = self.data + data
+            self.add_page(data)
 
             # Handling pagination paramters
             self.startposition += self.maxresults
+            self.maxresults = self.observe_page(self.endpoint, self.maxresults, len(data), stats)
             num_of_run += 1
 
         logging.info("Number of Requests: {0}".format(num_of_run))
 
+    def keyset_request(self):
+        """
+        Handles Request Parameters and keyset Pagination
+        Records are ordered by Id and every page continues after the last seen Id,
+        so no count request is needed and the cost of a page does not grow with the offset.
+        """
+
+        num_of_run = 0
+        num_of_records = 0
+
+        while True:
+            query = self.keyset_query(self.endpoint, self.last_id, self.maxresults)
+
+            logging.info("Request Query: {0}".format(query))
+            encoded_query = self.url_encode(query)
+            url = "{0}/{1}/query?query={2}".format(self.base_url, self.company_id, encoded_query)
+
+            stats = {}
+            results = self._request(url, stats=stats)
+
+            # If API returns error, raise exception and terminate application
+            if "fault" in results or "Fault" in results:
+                raise Exception(results)
+
+            # QueryResponse does not contain the entity when the page is empty
+            data = results["QueryResponse"].get(self.endpoint, [])
+            self.add_page(data)
+            num_of_run += 1
+            num_of_records += len(data)
+
+            if data:
+                self.last_id = data[-1]["Id"]
+            if len(data) < self.maxresults:
+                break
+            self.maxresults = self.observe_page(self.endpoint, self.maxresults, len(data), stats)
+
+        logging.info("Total Number of Records for {0}: {1}".format(self.endpoint, num_of_records))
+        logging.info("Number of Requests: {0}".format(num_of_run))
+
+    def add_page(self, data):
+        """
+        Handing over a page of entity records to the on_page callback or storing it in data
+        """
+        data = self.drop_duplicates(self.endpoint, data)
+        if self.on_page is not None:
+            self.on_page(data)
+        else:
+            self.data.extend(data)
+
+    def drop_duplicates(self, endpoint, data):
+        """
+        Dropping the records of the page which were already fetched by a previous page of the entity
+        Offset pages over live data shift when records are created or deleted during the extraction,
+        so a record can be returned by two pages. Only the Ids are kept, as integers when numeric.
+        """
+        seen = self.seen_ids.setdefault(endpoint, set())
+        ids = [int(record["Id"]) if record.get("Id", "").isdigit() else record.get("Id") for record in data]
+        if seen.isdisjoint(ids):
+            seen.update(ids)
+            return data
+
+        page = []
+        for record_id, record in zip(ids, data):
+            if record_id in seen:
+                self.duplicates[endpoint] = self.duplicates.get(endpoint, 0) + 1
+                continue
+            seen.add(record_id)
+            page.append(record)
+        return page
+
+    def finish_deduplication(self, endpoint):
+        """
+        Releasing the seen Ids of the entity and logging the number of dropped duplicates
+        """
+        self.seen_ids.pop(endpoint, None)
+        duplicates = self.duplicates.pop(endpoint, 0)
+        if duplicates:
+            logging.warning(
+                "Dropped {0} duplicate records of {1} returned by more than one page.".format(duplicates, endpoint)
+            )
+
     def custom_request(self, input_query):
         """
         Handles Request Parameters and Pagination
@@ -251,50 +569,117 @@ class QuickbooksClient:
         API request for Report Endpoint
         """
 
+        urls, enddate = self.report_urls(endpoint, start_date, end_date, self.report_columns.get(endpoint))
+
+        self.data = self._report_request(urls[0], params, enddate)
+        if len(urls) > 1:
+            self.data_2 = self._report_request(urls[1], params, enddate)
+
+    def report_urls(self, endpoint, start_date, end_date, columns=None):
+        """
+        Constructing the request URLs of the report
+        columns - columns of the detail report to request, DEFAULT_REPORT_COLUMNS if not specified
+        Returns ([accrual URL, cash URL] for reports requiring accounting type or [URL], end date)
+        """
+
+        query = []
         if start_date == "":
-            date_param = ""
-
-            # For GeneralLedger ONLY
-            if endpoint == "GeneralLedger":
-                date_param = (
-                    "?columns=klass_name,account_name,account_num,chk_print_state,create_by,create_date,"
-                    "cust_name,doc_num,emp_name,inv_date,is_adj,is_ap_paid,is_ar_paid,is_cleared,item_name,"
-                    "last_mod_by,last_mod_date,memo,name,quantity,rate,split_acc,tx_date,txn_type,vend_name,"
-                    "net_amount,tax_amount,tax_code,dept_name,subt_nat_amount,rbal_nat_amount,debt_amt,"
-                    "credit_amt "
-                )
+            enddate = None
         else:
             startdate = (dateparser.parse(start_date)).strftime("%Y-%m-%d")
             enddate = (dateparser.parse(end_date)).strftime("%Y-%m-%d")
 
             if startdate > enddate:
-                raise Exception("Please validate your date parameter for {0}".format(endpoint))
-
-            date_param = "?start_date={0}&end_date={1}".format(startdate, enddate)
-
-            # For GeneralLedger ONLY
-            if endpoint == "GeneralLedger":
-                date_param = (
-                    date_param + "&columns=dklass_name,account_name,account_num,chk_print_state,"
-                    "create_by,create_date,cust_name,doc_num,emp_name,inv_date,is_adj,"
-                    "is_ap_paid,is_ar_paid,"
-                    "is_cleared,item_name,last_mod_by,last_mod_date,memo,name,quantity,rate,"
-                    "split_acc,tx_date,"
-                    "txn_type,vend_name,net_amount,tax_amount,tax_code,dept_name,"
-                    "subt_nat_amount,rbal_nat_amount,debt_amt,credit_amt"
-                )
+                raise QuickBooksClientException("Please validate your date parameter for {0}".format(endpoint))
 
-        url = "{0}/{1}/reports/{2}{3}".format(self.base_url, self.company_id, endpoint, date_param)
+            query.append("start_date={0}&end_date={1}".format(startdate, enddate))
+
+        columns = columns or DEFAULT_REPORT_COLUMNS.get(endpoint)
+        if columns:
+            query.append("columns={0}".format(",".join(columns)))
+
+        url = "{0}/{1}/reports/{2}".format(self.base_url, self.company_id, endpoint)
+        if query:
+            url = url + "?" + "&".join(query)
         if endpoint in self.reports_required_accounting_type:
-            accrual_url = url + "&accounting_method=Accrual"
-            cash_url = url + "&accounting_method=Cash"
+            separator = "&" if query else "?"
+            accrual_url = url + separator + "accounting_method=Accrual"
+            cash_url = url + separator + "accounting_method=Cash"
+            return [accrual_url, cash_url], enddate
 
-            results = self._request(accrual_url, params)
-            self.data = results
+        return [url], enddate
 
-            results_2 = self._request(cash_url, params)
-            self.data_2 = results_2
+    def _report_request(self, url, params, end_date):
+        """
+        Handles Report Request with the report cache
+        """
 
-        else:
-            results = self._request(url)
-            self.data = results
+        results, key = self.get_cached_report(url, params, end_date)
+        if results is None:
+            results = self._request(url, params)
+            self.cache_report(key, end_date, results)
+        return results
+
+    def get_cached_report(self, url, params, end_date):
+        """
+        Looking up the report in the report cache
+        Reports of closed periods (ending on or before the books closing date) are cached until the books
+        are reopened, other reports are cached for report_cache_ttl hours.
+        Returns (cached results or None, cache key or None if the report cannot be cached)
+        """
+
+        if self.report_cache is None or not end_date:
+            return None, None
+
+        key = hashlib.md5(json.dumps([url, params], sort_keys=True).encode("utf-8")).hexdigest()
+        self.report_cache_used.add(key)
+
+        entry = self.report_cache.get(key)
+        if entry:
+            age = datetime.datetime.now(datetime.timezone.utc) - datetime.datetime.fromisoformat(entry["ts"])
+            closed = end_date <= self.get_book_close_date()
+            if (entry["closed"] and closed) or age < datetime.timedelta(hours=self.report_cache_ttl):
+                logging.info("Using cached report from {0}: {1}".format(entry["ts"], url))
+                return json.loads(zlib.decompress(base64.b64decode(entry["data"]))), key
+
+        return None, key
+
+    def cache_report(self, key, end_date, results):
+        """
+        Storing the report results in the report cache
+        Reports of open periods are stored only if they can be reused within report_cache_ttl hours.
+        """
+
+        if key is None:
+            return
+
+        closed = end_date <= self.get_book_close_date()
+        if not closed and self.report_cache_ttl <= 0:
+            self.report_cache.pop(key, None)
+            return
+
+        self.report_cache[key] = {
+            "ts": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "closed": closed,
+            "data": base64.b64encode(zlib.compress(json.dumps(results).encode("utf-8"))).decode("ascii"),
+        }
+
+    def get_book_close_date(self):
+        """
+        Fetch the books closing date of the company, empty string if the books are not closed
+        """
+
+        if self.book_close_date is None:
+            encoded_query = self.url_encode(BOOK_CLOSE_DATE_QUERY)
+            url = "{0}/{1}/query?query={2}".format(self.base_url, self.company_id, encoded_query)
+            self.set_book_close_date(self._request(url)["QueryResponse"])
+
+        return self.book_close_date
+
+    def set_book_close_date(self, query_response):
+        """
+        Storing the books closing date from the QueryResponse of the Preferences query
+        """
+        preferences = query_response.get("Preferences", [{}])[0]
+        self.book_close_date = preferences.get("AccountingInfoPrefs", {}).get("BookCloseDate", "")
+        logging.info("Books closing date: {0}".format(self.book_close_date or "not set"))
@@ -1,17 +1,31 @@
 import os
+import asyncio
 import logging
 import datetime
 import requests
 import backoff
+import hashlib
 import json
+import queue
+import threading
+import contextlib
+import argparse
+import shutil
+import time
 
 from mapping import Mapping
-from client import QuickbooksClient, QuickBooksClientException
+from client import QuickbooksClient, QuickBooksClientException, requesting, REPORT_COLUMNS
+from async_client import AsyncQuickbooksClient, DEFAULT_MAX_CONCURRENT_REQUESTS
 from report_mapping import ReportMapping
+from estimate import ExtractionEstimate
+from raw_output import NdjsonWriter
+from profiling import Profiler
+from page_size import MAX_PAGE_SIZE
 from datetime import date
 from dateutil.relativedelta import relativedelta
 
-from keboola.component.base import ComponentBase
+from keboola.component.base import ComponentBase, sync_action
+from keboola.component.sync_actions import MessageType, ValidationResult
 from keboola.component.exceptions import UserException  # noqa
 
 URL_SUFFIX = os.environ.get("KBC_STACKID", "connection.keboola.com").replace("connection.", "")
@@ -25,24 +39,182 @@ KEY_START_DATE = "start_date"
 KEY_END_DATE = "end_date"
 KEY_GROUP_DESTINATION = "destination"
 KEY_LOAD_TYPE = "load_type"
+KEY_SLICED_OUTPUT = "sliced_output"
+KEY_OUTPUT_FORMAT = "output_format"
+KEY_COMPRESS_OUTPUT = "compress_output"
 KEY_SUMMARIZE_COLUMN_BY = "summarize_column_by"
+KEY_REPORT_COLUMNS = "report_columns"
+GROUP_EXTRACTION_SETTINGS = "extraction_settings"
+KEY_PAGINATION = "pagination"
+KEY_CHECKPOINTING = "checkpointing"
+KEY_BATCH_REQUESTS = "batch_requests"
+KEY_SKIP_UNCHANGED = "skip_unchanged"
+KEY_REPORT_CACHE = "report_cache"
+KEY_REPORT_CACHE_TTL = "report_cache_ttl"
+KEY_PIPELINE = "pipeline"
+KEY_HTTP_BACKEND = "http_backend"
+KEY_MAX_CONCURRENT_REQUESTS = "max_concurrent_requests"
+KEY_PROFILING = "profiling"
+KEY_ADAPTIVE_PAGE_SIZE = "adaptive_page_size"
+
+# number of fetched pages waiting to be flattened in the pipelined extraction
+PIPELINE_QUEUE_SIZE = 4
+
+# seconds the worker waits before checking the job queue again
+WORKER_POLL_INTERVAL = 5
 
 # list of mandatory parameters => if some is missing,
 # component will fail with readable message on initialization.
 REQUIRED_PARAMETERS = [KEY_COMPANY_ID, KEY_ENDPOINTS, KEY_REPORTS, KEY_GROUP_DESTINATION]
 
 
+class PipelineStopped(Exception):
+    """Raised in the fetching thread of the pipelined extraction once the main thread stopped."""
+
+
 class Component(ComponentBase):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, data_path_override=None, storage_api_state=True):
+        super().__init__(data_path_override=data_path_override)
+        # Rotated tokens and checkpoints are saved to the configuration state with Storage API,
+        # otherwise they are only written to the state file of the job
+        self.storage_api_state = storage_api_state
         self.summarize_column_by = None
+        self.report_columns = {}
+        self.pagination = None
+        self.checkpointing = None
+        self.checkpoint = None
+        self.state = None
+        self.encrypted_tokens = {}
+        self.profiling = None
         self.incremental = None
+        self.sliced = None
+        self.raw = None
+        self.compress = None
         self.end_date = None
         self.start_date = None
         self.refresh_token = None
         self.access_token = None
 
     def run(self):
+        extraction_settings = self.configuration.parameters.get(GROUP_EXTRACTION_SETTINGS) or {}
+        self.profiling = extraction_settings.get(KEY_PROFILING, "off")
+
+        # Endpoints are profiled separately only when they are extracted one after another
+        concurrent = extraction_settings.get(KEY_PIPELINE) or extraction_settings.get(KEY_HTTP_BACKEND) == "async"
+        if self.profiling == "endpoint" and concurrent:
+            logging.warning("Endpoints are extracted concurrently, profiling the whole run instead.")
+            self.profiling = "run"
+
+        with self.profile("run", self.profiling == "run"):
+            self.run_extraction()
+
+    def profile(self, name, enabled=True):
+        """Returns the profiler of the code block if enabled"""
+        if not enabled:
+            return contextlib.nullcontext()
+        return Profiler(name, destination=self.files_out_path)
+
+    def run_extraction(self):
+        quickbooks_param, endpoints, extraction_settings = self.init_client()
+        async_backend = isinstance(quickbooks_param, AsyncQuickbooksClient)
+
+        if extraction_settings.get(KEY_REPORT_CACHE, False):
+            quickbooks_param.enable_report_cache(
+                cache=self.get_state_file().get("report_cache") or {},
+                ttl_hours=extraction_settings.get(KEY_REPORT_CACHE_TTL, 0),
+            )
+
+        if extraction_settings.get(KEY_ADAPTIVE_PAGE_SIZE, False):
+            quickbooks_param.enable_adaptive_page_size(sizes=self.get_state_file().get("page_sizes") or {})
+
+        completed = self.checkpoint["completed"] if self.checkpointing else []
+
+        if extraction_settings.get(KEY_SKIP_UNCHANGED, False):
+            unchanged = self.get_unchanged_endpoints(quickbooks_param, endpoints)
+            completed = completed + unchanged
+        else:
+            unchanged = []
+
+        if extraction_settings.get(KEY_BATCH_REQUESTS, False):
+            self.prefetch(quickbooks_param, [endpoint for endpoint in endpoints if endpoint not in completed])
+
+        # Endpoints to extract as (checkpoint key, endpoint, report_api_bool)
+        tasks = []
+        for endpoint in endpoints:
+            checkpoint_key = endpoint
+            if self.checkpointing and checkpoint_key in self.checkpoint["completed"]:
+                logging.info(f"Skipping {checkpoint_key}, already extracted by the previous run.")
+                continue
+            if checkpoint_key in unchanged:
+                logging.info(f"Skipping {checkpoint_key}, no records changed since the previous run.")
+                continue
+
+            if "**" in endpoint:
+                endpoint = endpoint.split("**")[0]
+                report_api_bool = True
+            else:
+                endpoint = endpoint
+                report_api_bool = False
+            tasks.append((checkpoint_key, endpoint, report_api_bool))
+
+        # Fetching reports for each configured endpoint
+        try:
+            if async_backend:
+                asyncio.run(self.extract_async(quickbooks_param, tasks))
+            elif extraction_settings.get(KEY_PIPELINE, False):
+                self.extract_pipelined(quickbooks_param, tasks)
+            else:
+                self.extract(quickbooks_param, tasks)
+        except Exception:
+            # The state file of a worker job is the only state of the configuration, it keeps the checkpoint
+            if self.checkpointing and not self.storage_api_state:
+                self.save_checkpoint()
+            raise
+
+        if quickbooks_param.report_cache is not None:
+            self.state["report_cache"] = quickbooks_param.get_report_cache()
+
+        if quickbooks_param.page_sizes is not None:
+            logging.info(f"Page sizes for the next run: {quickbooks_param.page_sizes.sizes}")
+            self.state["page_sizes"] = quickbooks_param.page_sizes.sizes
+
+        # The run succeeded, the state file does not keep the checkpoint
+        self.write_state_file(self.state)
+
+    @sync_action("estimate")
+    def estimate(self):
+        """Estimates the requests, output tables, data size and runtime of the configured extraction."""
+        quickbooks_param, endpoints, extraction_settings = self.init_client()
+
+        report_params = {}
+        for endpoint in endpoints:
+            if "**" in endpoint:
+                endpoint = endpoint.split("**")[0]
+                report_params[endpoint] = self.get_report_params(quickbooks_param, endpoint, True)
+
+        concurrency = 1
+        if isinstance(quickbooks_param, AsyncQuickbooksClient):
+            concurrency = quickbooks_param.max_concurrent_requests
+
+        try:
+            estimate = ExtractionEstimate(
+                client=quickbooks_param,
+                endpoints=endpoints,
+                start_date=self.start_date,
+                end_date=self.end_date,
+                report_params=report_params,
+                concurrency=concurrency,
+            )
+        except QuickBooksClientException as e:
+            raise UserException(e) from e
+
+        return ValidationResult(estimate.to_markdown(), MessageType.INFO)
+
+    def init_client(self):
+        """
+        Processes the configuration and returns the QuickBooks client with refreshed tokens,
+        the configured endpoints and reports and the extraction settings.
+        """
         self.validate_configuration_parameters(REQUIRED_PARAMETERS)
         params = self.configuration.parameters
 
@@ -79,71 +251,522 @@ class Component(ComponentBase):
         else:
             self.incremental = False
         logging.info(f"Load type incremental set to: {self.incremental}")
+        self.sliced = destination_params.get(KEY_SLICED_OUTPUT, False)
+        self.raw = destination_params.get(KEY_OUTPUT_FORMAT, "csv") == "ndjson"
+        self.compress = destination_params.get(KEY_COMPRESS_OUTPUT, False)
+        if self.raw:
+            logging.info("Raw NDJSON output enabled, records are not flattened.")
 
         self.summarize_column_by = (
             params.get(KEY_SUMMARIZE_COLUMN_BY) if params.get(KEY_SUMMARIZE_COLUMN_BY) else self.summarize_column_by
         )
-
-        self.write_state_file(
-            {
-                "tokens": {
-                    "ts": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
-                    "#refresh_token": self.refresh_token,
-                    "#access_token": self.access_token,
-                }
+        self.report_columns = self.get_report_columns(params.get(KEY_REPORT_COLUMNS) or [])
+
+        extraction_settings = params.get(GROUP_EXTRACTION_SETTINGS) or {}
+        self.pagination = extraction_settings.get(KEY_PAGINATION, "offset")
+        logging.info(f"Pagination strategy set to: {self.pagination}")
+        self.checkpointing = extraction_settings.get(KEY_CHECKPOINTING, False)
+        if self.checkpointing:
+            self.checkpoint = self.load_checkpoint(endpoints)
+
+        self.state = {
+            "tokens": {
+                "ts": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+                "#refresh_token": self.refresh_token,
+                "#access_token": self.access_token,
             }
-        )
-
-        quickbooks_param = QuickbooksClient(
-            company_id=company_id,
-            refresh_token=self.refresh_token,
-            access_token=self.access_token,
-            oauth=oauth,
-            sandbox=sandbox,
-        )
+        }
+        self.write_state_file(self.state)
+
+        if extraction_settings.get(KEY_HTTP_BACKEND, "requests") == "async":
+            logging.info("Using asyncio HTTP/2 backend.")
+            quickbooks_param = AsyncQuickbooksClient(
+                company_id=company_id,
+                refresh_token=self.refresh_token,
+                access_token=self.access_token,
+                oauth=oauth,
+                sandbox=sandbox,
+                pagination=self.pagination,
+                max_concurrent_requests=extraction_settings.get(
+                    KEY_MAX_CONCURRENT_REQUESTS, DEFAULT_MAX_CONCURRENT_REQUESTS
+                ),
+            )
+        else:
+            quickbooks_param = QuickbooksClient(
+                company_id=company_id,
+                refresh_token=self.refresh_token,
+                access_token=self.access_token,
+                oauth=oauth,
+                sandbox=sandbox,
+                pagination=self.pagination,
+            )
 
+        quickbooks_param.report_columns = self.report_columns
         self.process_oauth_tokens(quickbooks_param)
 
-        # Fetching reports for each configured endpoint
-        for endpoint in endpoints:
-            if "**" in endpoint:
-                endpoint = endpoint.split("**")[0]
-                report_api_bool = True
-            else:
-                endpoint = endpoint
-                report_api_bool = False
+        return quickbooks_param, endpoints, extraction_settings
 
-            # Phase 1: Request
-            # Handling Quickbooks Requests
-            self.fetch(quickbooks_param=quickbooks_param, endpoint=endpoint, report_api_bool=report_api_bool)
+    @staticmethod
+    def get_report_columns(report_columns):
+        """Validates the column selection of the detail reports and returns it as {report: columns}."""
+        selected = {}
+        for item in report_columns:
+            report = item.get("report", "").replace("**", "")
+            if report not in REPORT_COLUMNS:
+                raise UserException(
+                    f"Columns cannot be selected for the {report} report. "
+                    f"Supported reports: {', '.join(REPORT_COLUMNS)}"
+                )
 
-            # Phase 2: Mapping
-            # Translate Input JSON file into CSV with configured mapping
-            # For different accounting_type,
-            # input_data will be outputting Accrual Type
-            # input_data_2 will be outputting Cash Type
-            logging.info("Parsing API results...")
-            input_data = quickbooks_param.data
+            columns = list(dict.fromkeys(item.get("columns") or []))
+            unknown = [column for column in columns if column not in REPORT_COLUMNS[report]]
+            if unknown:
+                raise UserException(
+                    f"Unknown columns of the {report} report: {', '.join(unknown)}. "
+                    f"Valid columns are: {', '.join(REPORT_COLUMNS[report])}"
+                )
+            if columns:
+                logging.info(f"Requesting {report} report columns: {columns}")
+                selected[report] = columns
+        return selected
+
+    def extract(self, quickbooks_param, tasks):
+        """Fetches and outputs the endpoints one after another."""
+        for checkpoint_key, endpoint, report_api_bool in tasks:
+            with self.profile(endpoint, self.profiling == "endpoint"):
+                self.extract_endpoint(quickbooks_param, checkpoint_key, endpoint, report_api_bool)
+
+    def extract_endpoint(self, quickbooks_param, checkpoint_key, endpoint, report_api_bool):
+        """Fetches and outputs one endpoint."""
+        # Raw entity records are written page by page as they are fetched
+        writer = self.get_raw_writer(endpoint) if self.raw and not report_api_bool else None
+
+        # Rows of an entity continued from the checkpoint are appended to the tables written by the failed run
+        resume = self.get_resume_position(endpoint, report_api_bool)
+        # Sliced entity tables are written page by page as they are fetched
+        mapping = None
+        if self.sliced and not (self.raw or report_api_bool):
+            mapping = self.get_entity_mapping(endpoint, incremental=resume is not None)
+
+        if writer:
+            on_page = writer.write
+        elif mapping:
+            on_page = mapping.write_page
+        else:
+            on_page = None
 
-            # if there are no data
-            # output blank
-            if len(input_data) == 0:
+        # Phase 1: Request
+        # Handling Quickbooks Requests
+        try:
+            self.fetch(
+                quickbooks_param=quickbooks_param,
+                endpoint=endpoint,
+                report_api_bool=report_api_bool,
+                params=self.get_report_params(quickbooks_param, endpoint, report_api_bool),
+                resume=resume,
+                on_page=on_page,
+            )
+        except Exception:
+            if self.checkpointing:
+                self.save_partial_checkpoint(quickbooks_param, endpoint, report_api_bool, resume is not None, mapping)
+            raise
+
+        # Phase 2: Mapping
+        if writer:
+            writer.close()
+        elif mapping:
+            logging.info("Parsing API results...")
+            mapping.output()
+        else:
+            self.write_output(
+                quickbooks_param, endpoint, report_api_bool, quickbooks_param.data, incremental=resume is not None
+            )
+        self.complete_checkpoint(checkpoint_key)
+
+    def extract_pipelined(self, quickbooks_param, tasks):
+        """
+        Fetches the endpoints in a background thread while the main thread flattens and outputs
+        the already fetched pages. Threads are connected with a bounded queue, so fetching waits
+        when flattening falls behind. If the main thread fails, the fetching thread is stopped and joined.
+        """
+        pipeline = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        resume = {task: self.get_resume_position(task[1], task[2]) for task in tasks}
+        # Set when the main thread stops processing, the fetching stops at the next page
+        stopped = threading.Event()
+
+        def put(item):
+            """Queues the item for the main thread, waits while the queue is full"""
+            if stopped.is_set():
+                raise PipelineStopped()
+            pipeline.put(item)
+
+        def produce():
+            try:
+                for task in tasks:
+                    _, endpoint, report_api_bool = task
+                    self.fetch(
+                        quickbooks_param=quickbooks_param,
+                        endpoint=endpoint,
+                        report_api_bool=report_api_bool,
+                        params=self.get_report_params(quickbooks_param, endpoint, report_api_bool),
+                        resume=resume[task],
+                        on_page=lambda page, task=task: put(("page", task, page)),
+                    )
+                    put(("end", task, (quickbooks_param.data, quickbooks_param.data_2)))
+            except PipelineStopped:
                 pass
+            except Exception as e:
+                pipeline.put(("error", None, e))
             else:
-                logging.info("Report API Template Enable: {0}".format(report_api_bool))
-                if report_api_bool:
-                    if endpoint == "CustomQuery":
-                        # Not implemented
-                        ReportMapping(endpoint=endpoint, data=input_data, query=self.start_date)
+                pipeline.put(("done", None, None))
+
+        producer = threading.Thread(target=produce, name="quickbooks-fetch", daemon=True)
+        producer.start()
+
+        mapping = None
+        writer = None
+        try:
+            while True:
+                kind, task, payload = pipeline.get()
+
+                if kind == "page" and self.raw:
+                    if writer is None:
+                        writer = self.get_raw_writer(task[1])
+                    writer.write(payload)
+
+                elif kind == "page":
+                    if mapping is None:
+                        mapping = self.get_entity_mapping(task[1], incremental=resume[task] is not None)
+                    # with sliced output, the rows of the page are not kept in memory
+                    mapping.write_page(payload)
+
+                elif kind == "end":
+                    checkpoint_key, endpoint, report_api_bool = task
+                    input_data, input_data_2 = payload
+                    if writer is not None:
+                        writer.close()
+                        writer = None
+                    elif mapping is not None:
+                        logging.info("Parsing API results...")
+                        mapping.output()
+                        mapping = None
                     else:
-                        if endpoint in quickbooks_param.reports_required_accounting_type:
-                            input_data_2 = quickbooks_param.data_2
-                            ReportMapping(endpoint=endpoint, data=input_data, accounting_type="accrual")
-                            ReportMapping(endpoint=endpoint, data=input_data_2, accounting_type="cash")
-                        else:
-                            ReportMapping(endpoint=endpoint, data=input_data)
+                        self.write_output(
+                            quickbooks_param,
+                            endpoint,
+                            report_api_bool,
+                            input_data,
+                            input_data_2,
+                            incremental=resume[task] is not None,
+                        )
+                    self.complete_checkpoint(checkpoint_key)
+
+                elif kind == "error":
+                    # The producer has stopped, all pages fetched before the failure were already flattened
+                    if self.checkpointing:
+                        endpoint = mapping.endpoint if mapping is not None else None
+                        if mapping is not None and self.incremental:
+                            mapping.write_always = True
+                            mapping.output()
+                            self.checkpoint["entity"] = {
+                                "endpoint": endpoint,
+                                "position": quickbooks_param.get_progress(),
+                            }
+                        self.save_checkpoint()
+                    raise payload
+
+                else:
+                    break
+        finally:
+            stopped.set()
+            # Pages waiting in the queue are dropped, so the producer is not blocked on a full queue
+            while True:
+                try:
+                    pipeline.get_nowait()
+                except queue.Empty:
+                    break
+            producer.join()
+            if writer is not None:
+                writer.close()
+
+    async def extract_async(self, quickbooks_param, tasks):
+        """
+        Fetches all endpoints concurrently with the asyncio client and outputs every endpoint
+        as soon as it is fetched. Interrupted entities are not resumed, they are fetched concurrently by pages.
+        """
+
+        async def fetch(task):
+            _, endpoint, report_api_bool = task
+            logging.info(f"Fetching endpoint {endpoint} with date rage: {self.start_date} - {self.end_date}")
+            try:
+                data, data_2 = await quickbooks_param.fetch_async(
+                    endpoint=endpoint,
+                    report_api_bool=report_api_bool,
+                    start_date=self.start_date,
+                    end_date=self.end_date,
+                    params=self.get_report_params(quickbooks_param, endpoint, report_api_bool),
+                )
+            except QuickBooksClientException as e:
+                raise UserException(e) from e
+            return task, data, data_2
+
+        async with quickbooks_param:
+            try:
+                for fetched in asyncio.as_completed([fetch(task) for task in tasks]):
+                    (checkpoint_key, endpoint, report_api_bool), data, data_2 = await fetched
+                    self.write_output(quickbooks_param, endpoint, report_api_bool, data, data_2)
+                    self.complete_checkpoint(checkpoint_key)
+            except Exception:
+                if self.checkpointing:
+                    self.save_checkpoint()
+                raise
+
+    def get_raw_writer(self, file_name):
+        return NdjsonWriter(
+            file_name, compress=self.compress, tags=["quickbooks", file_name], destination=self.files_out_path
+        )
+
+    def write_raw_output(self, quickbooks_param, endpoint, report_api_bool, input_data, input_data_2):
+        """
+        Output the records as NDJSON without flattening, every report response is written as one line
+        """
+        if not report_api_bool:
+            outputs = {endpoint: input_data}
+        elif endpoint in quickbooks_param.reports_required_accounting_type:
+            outputs = {f"{endpoint}_accrual": [input_data], f"{endpoint}_cash": [input_data_2]}
+        else:
+            outputs = {endpoint: [input_data]}
+
+        for file_name, records in outputs.items():
+            writer = self.get_raw_writer(file_name)
+            writer.write(records)
+            writer.close()
+
+    def write_output(
+        self, quickbooks_param, endpoint, report_api_bool, input_data, input_data_2=None, incremental=False
+    ):
+        """
+        Translate Input JSON file into CSV with configured mapping
+        For different accounting_type,
+        input_data will be outputting Accrual Type
+        input_data_2 will be outputting Cash Type
+        incremental - the entity continues the output of a failed run, its rows are appended
+        """
+        if input_data_2 is None:
+            input_data_2 = quickbooks_param.data_2
+
+        if self.raw:
+            self.write_raw_output(quickbooks_param, endpoint, report_api_bool, input_data, input_data_2)
+            return
+
+        logging.info("Parsing API results...")
+
+        # if there are no data
+        # output blank
+        if len(input_data) == 0:
+            pass
+        else:
+            logging.info("Report API Template Enable: {0}".format(report_api_bool))
+            if report_api_bool:
+                if endpoint == "CustomQuery":
+                    # Not implemented
+                    ReportMapping(
+                        endpoint=endpoint, data=input_data, query=self.start_date,
+                        write_always=self.checkpointing,
+                        sliced=self.sliced,
+                        destination=self.tables_out_path,
+                    )
                 else:
-                    Mapping(endpoint=endpoint, data=input_data)
+                    if endpoint in quickbooks_param.reports_required_accounting_type:
+                        ReportMapping(
+                            endpoint=endpoint,
+                            data=input_data,
+                            accounting_type="accrual",
+                            write_always=self.checkpointing,
+                            sliced=self.sliced,
+                            destination=self.tables_out_path,
+                        )
+                        ReportMapping(
+                            endpoint=endpoint,
+                            data=input_data_2,
+                            accounting_type="cash",
+                            write_always=self.checkpointing,
+                            sliced=self.sliced,
+                            destination=self.tables_out_path,
+                        )
+                    else:
+                        ReportMapping(
+                            endpoint=endpoint,
+                            data=input_data,
+                            write_always=self.checkpointing,
+                            sliced=self.sliced,
+                            destination=self.tables_out_path,
+                        )
+            elif self.sliced:
+                # Records fetched at once are written as one slice per page, like the pages fetched one by one
+                mapping = self.get_entity_mapping(endpoint, incremental=incremental)
+                for start in range(0, len(input_data), MAX_PAGE_SIZE):
+                    mapping.write_page(input_data[start:start + MAX_PAGE_SIZE])
+                mapping.output()
+            else:
+                Mapping(
+                    endpoint=endpoint,
+                    data=input_data,
+                    write_always=self.checkpointing,
+                    sliced=self.sliced,
+                    destination=self.tables_out_path,
+                    incremental=incremental,
+                )
+
+    def get_entity_mapping(self, endpoint, incremental=False):
+        """Returns the mapping of the entity receiving its records page by page with write_page()."""
+        return Mapping(
+            endpoint=endpoint,
+            data=None,
+            write_always=self.checkpointing,
+            sliced=self.sliced,
+            destination=self.tables_out_path,
+            incremental=incremental,
+        )
+
+    def complete_checkpoint(self, checkpoint_key):
+        """
+        Marks the endpoint as extracted in the checkpoint. Worker jobs write the checkpoint to the state file
+        only when they fail, the state file of a successful job must not skip any endpoint in the next job.
+        """
+        if self.checkpointing:
+            self.checkpoint["completed"].append(checkpoint_key)
+            self.checkpoint["entity"] = {}
+            if self.storage_api_state:
+                self.save_checkpoint()
+
+    def get_unchanged_endpoints(self, quickbooks_param, endpoints):
+        """
+        Probes the number of records and the last update time of the entities and compares them
+        with the previous run. Returns the endpoints which did not change and saves the probes to the state file.
+        """
+        entities = [endpoint for endpoint in endpoints if "**" not in endpoint]
+        logging.info("Checking entities for changes since the previous run")
+        try:
+            probes = quickbooks_param.probe(entities)
+        except QuickBooksClientException as e:
+            raise UserException(e) from e
+
+        # Entities output with different output settings have to be output again
+        fingerprint = self.get_output_fingerprint()
+        previous_probes = self.get_state_file().get("probes") or {}
+        if previous_probes and self.get_state_file().get("probes_fingerprint") != fingerprint:
+            logging.info("Output settings changed since the previous run, extracting all entities.")
+            previous_probes = {}
+        unchanged = [endpoint for endpoint in probes if probes[endpoint] == previous_probes.get(endpoint)]
+        logging.info(f"Unchanged entities: {unchanged}")
+
+        # State file is stored only when the job succeeds, i.e. after all changed entities were output
+        self.state["probes"] = probes
+        self.state["probes_fingerprint"] = fingerprint
+        self.write_state_file(self.state)
+        return unchanged
+
+    def get_output_fingerprint(self):
+        """Returns the fingerprint of the settings which change the output of the entities."""
+        return hashlib.md5(
+            json.dumps([self.incremental, self.sliced, self.raw, self.compress]).encode("utf-8")
+        ).hexdigest()
+
+    def load_checkpoint(self, endpoints):
+        """Returns the checkpoint left by a failed run if it was created with the same configuration."""
+        fingerprint = hashlib.md5(
+            json.dumps(
+                [sorted(endpoints), self.start_date, self.end_date, self.summarize_column_by, self.pagination]
+            ).encode("utf-8")
+        ).hexdigest()
+
+        checkpoint = self.get_state_file().get("checkpoint") or {}
+        if checkpoint.get("fingerprint") != fingerprint:
+            if checkpoint:
+                logging.info("Checkpoint was created with a different configuration, starting from the beginning.")
+            return {"fingerprint": fingerprint, "completed": [], "entity": {}}
+
+        logging.info(f"Resuming from checkpoint, already extracted: {checkpoint['completed']}")
+        return checkpoint
+
+    def get_resume_position(self, endpoint, report_api_bool):
+        """
+        Returns the pagination position of a partially extracted entity. Partial output is only resumed
+        for incremental load, a full load would overwrite the rows written by the failed run.
+        """
+        if not (self.checkpointing and self.incremental) or report_api_bool:
+            return None
+
+        entity = self.checkpoint.get("entity") or {}
+        if entity.get("endpoint") != endpoint:
+            return None
+
+        logging.info(f"Resuming {endpoint} from {entity['position']}")
+        return entity["position"]
+
+    def save_partial_checkpoint(self, quickbooks_param, endpoint, report_api_bool, resumed=False, mapping=None):
+        """
+        Outputs the pages fetched before the failure and saves the pagination position of the entity.
+        resumed - the entity was continued from the checkpoint, its rows are appended to the earlier output
+        mapping - mapping which already wrote the fetched pages as slices
+        """
+        if self.incremental and not report_api_bool and (mapping is not None or quickbooks_param.data):
+            if mapping is not None:
+                mapping.write_always = True
+                mapping.output()
+            else:
+                logging.info(f"Writing {len(quickbooks_param.data)} already fetched records of {endpoint}.")
+                Mapping(
+                    endpoint=endpoint,
+                    data=quickbooks_param.data,
+                    write_always=True,
+                    sliced=self.sliced,
+                    destination=self.tables_out_path,
+                    incremental=resumed,
+                )
+            self.checkpoint["entity"] = {"endpoint": endpoint, "position": quickbooks_param.get_progress()}
+        self.save_checkpoint()
+
+    def save_checkpoint(self) -> None:
+        """
+        Saves the checkpoint using Storage API, state file is not stored when the job fails.
+        The checkpoint is dropped by the state file written at the end of the run once the job succeeds.
+        Without Storage API state (worker jobs), the checkpoint is written to the state file of the failed job.
+        """
+        logging.debug(f"Saving checkpoint: {self.checkpoint}")
+
+        state = {
+            "checkpoint": self.checkpoint,
+            # probes of the last successful run, entities skipped by this run were not output yet
+            "probes": self.get_state_file().get("probes") or {},
+            "probes_fingerprint": self.get_state_file().get("probes_fingerprint"),
+            "report_cache": self.get_state_file().get("report_cache") or {},
+            "page_sizes": self.get_state_file().get("page_sizes") or {},
+        }
+        if not self.storage_api_state:
+            self.write_state_file({"tokens": self.state["tokens"], **state})
+            return
+
+        try:
+            tokens = self.get_encrypted_tokens(self.refresh_token, self.access_token)
+            new_state = {"component": {"tokens": tokens, **state}}
+            self.update_config_state(
+                component_id=self.environment_variables.component_id,
+                configurationId=self.environment_variables.config_id,
+                state=new_state,
+                branch_id=self.environment_variables.branch_id,
+            )
+        except requests.exceptions.RequestException:
+            logging.warning("Storage API is unavailable. Skipping checkpoint save.")
+
+    def get_report_params(self, quickbooks_param, endpoint, report_api_bool):
+        """Returns additional request parameters for reports supporting summarize_column_by, otherwise None."""
+        if not (report_api_bool and self.summarize_column_by):
+            return None
+        if endpoint not in quickbooks_param.reports_supporting_summarize_column_by:
+            return None
+        return {"summarize_column_by": self.summarize_column_by}
 
     def get_tokens(self, oauth):
         try:
@@ -180,24 +803,25 @@ class Component(ComponentBase):
             self.access_token = new_access_token
 
     def save_new_oauth_tokens(self, refresh_token: str, access_token: str) -> None:
+        if not self.storage_api_state:
+            logging.debug("Saving new tokens to the state file.")
+            self.state["tokens"] = {
+                "ts": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+                "#refresh_token": refresh_token,
+                "#access_token": access_token,
+            }
+            self.write_state_file(self.state)
+            return
+
         logging.debug("Saving new tokens to state using Keboola API.")
 
         try:
-            encrypted_refresh_token = self.encrypt(refresh_token)
-            encrypted_access_token = self.encrypt(access_token)
+            tokens = self.get_encrypted_tokens(refresh_token, access_token)
         except requests.exceptions.RequestException:
             logging.warning("Encrypt API is unavailable. Skipping token save at the beginning of the run.")
             return
 
-        new_state = {
-            "component": {
-                "tokens": {
-                    "ts": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
-                    "#refresh_token": encrypted_refresh_token,
-                    "#access_token": encrypted_access_token,
-                }
-            }
-        }
+        new_state = {"component": {"tokens": tokens}}
         try:
             self.update_config_state(
                 component_id=self.environment_variables.component_id,
@@ -211,6 +835,16 @@ class Component(ComponentBase):
             )
             return
 
+    def get_encrypted_tokens(self, refresh_token: str, access_token: str) -> dict:
+        """Returns tokens state with encrypted tokens, the tokens are encrypted only once per run."""
+        if refresh_token not in self.encrypted_tokens:
+            self.encrypted_tokens[refresh_token] = {
+                "ts": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+                "#refresh_token": self.encrypt(refresh_token),
+                "#access_token": self.encrypt(access_token),
+            }
+        return self.encrypted_tokens[refresh_token]
+
     def _get_storage_token(self) -> str:
         token = self.configuration.parameters.get("#storage_token") or self.environment_variables.token
         if not token:
@@ -247,7 +881,7 @@ class Component(ComponentBase):
         response = requests.put(url, data=parameters, headers=headers)
         response.raise_for_status()
 
-    def fetch(self, quickbooks_param, endpoint, report_api_bool, query="", params=None):
+    def fetch(self, quickbooks_param, endpoint, report_api_bool, query="", params=None, resume=None, on_page=None):
         logging.info(f"Fetching endpoint {endpoint} with date rage: {self.start_date} - {self.end_date}")
         try:
             quickbooks_param.fetch(
@@ -257,10 +891,20 @@ class Component(ComponentBase):
                 end_date=self.end_date,
                 query=query if query else "",
                 params=params,
+                resume=resume,
+                on_page=on_page,
             )
         except QuickBooksClientException as e:
             raise UserException(e) from e
 
+    @staticmethod
+    def prefetch(quickbooks_param, endpoints):
+        logging.info("Fetching small entities with batch requests")
+        try:
+            quickbooks_param.prefetch(endpoints)
+        except QuickBooksClientException as e:
+            raise UserException(e) from e
+
     @staticmethod
     def process_date(dt):
         """Checks if date is in valid format. If not, raises UserException. If None, returns None"""
@@ -284,10 +928,64 @@ class Component(ComponentBase):
         return result.strftime(dt_format)
 
 
+def run_job(data_folder):
+    """
+    Runs the job of the data folder within the worker, returns whether the job succeeded
+    The environment of the worker does not belong to the job, so the state is only written to out/state.json.
+    """
+    logging.info(f"Running job {data_folder}")
+    # connections of the shared session are kept, cookies of the previous company are not
+    requesting.cookies.clear()
+    try:
+        comp = Component(data_path_override=data_folder, storage_api_state=False)
+        comp.execute_action()
+    except (Exception, SystemExit) as exc:
+        logging.exception(exc)
+        return False
+    return True
+
+
+def run_worker(queue_folder, poll_interval=WORKER_POLL_INTERVAL):
+    """
+    Long-lived worker executing the jobs queued in the queue folder one after another
+    Every job is a folder with config.json, in/ and out/ like the data folder of a job, finished jobs
+    are moved to the done/ or failed/ subfolder. The loaded mappings and the HTTP connection pool
+    are reused by all jobs of the process.
+    poll_interval - seconds to wait for new jobs, the worker exits once the queue is empty if 0
+    """
+    finished = {True: os.path.join(queue_folder, "done"), False: os.path.join(queue_folder, "failed")}
+    for folder in finished.values():
+        os.makedirs(folder, exist_ok=True)
+
+    while True:
+        jobs = sorted(
+            entry.path
+            for entry in os.scandir(queue_folder)
+            if entry.is_dir() and os.path.isfile(os.path.join(entry.path, "config.json"))
+        )
+        if not jobs:
+            if not poll_interval:
+                return
+            time.sleep(poll_interval)
+            continue
+
+        for job in jobs:
+            succeeded = run_job(job)
+            shutil.move(job, os.path.join(finished[succeeded], os.path.basename(job)))
+
+
 """
         Main entrypoint
 """
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--worker", help="folder with the queued jobs to run in a long-lived worker")
+    parser.add_argument("--poll-interval", type=float, default=WORKER_POLL_INTERVAL)
+    args, _ = parser.parse_known_args()
+    if args.worker:
+        run_worker(args.worker, args.poll_interval)
+        exit(0)
+
     try:
         comp = Component()
         # this triggers the run method by default and is controlled by the configuration.action parameter
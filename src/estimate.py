@@ -0,0 +1,167 @@
+import csv
+import io
+import json
+import logging
+import math
+import time
+
+from client import MAX_BATCH_SIZE, QuickBooksClientException
+from mapping import Mapping
+from report_mapping import ReportMapping, REPORTS_CANT_PARSE
+
+# QuickBooks Online throttles more than 500 requests per minute per company
+RATE_LIMIT_PER_MINUTE = 500
+# Number of records sampled per entity to estimate the output of the flattening
+SAMPLE_SIZE = 20
+PAGE_SIZE = 1000
+
+
+class ExtractionEstimate:
+    """
+    Estimating the requests, output rows, data size and runtime of the extraction
+    Entities are counted and sampled with batch requests, reports are requested once.
+    """
+
+    def __init__(self, client, endpoints, start_date, end_date, report_params=None, concurrency=1):
+        self.client = client
+        self.start_date = start_date
+        self.end_date = end_date
+        self.report_params = report_params or {}
+        self.concurrency = concurrency
+
+        self.entities = [endpoint for endpoint in endpoints if "**" not in endpoint]
+        self.reports = [endpoint.split("**")[0] for endpoint in endpoints if "**" in endpoint]
+
+        # Output
+        self.requests = 0
+        self.response_bytes = 0
+        self.tables = {}  # {table name: {"rows": ..., "bytes": ...}}
+        self.latencies = []
+
+        # Run
+        if self.entities:
+            self.estimate_entities()
+        for report in self.reports:
+            self.estimate_report(report)
+
+    def estimate_entities(self):
+        """
+        Counting and sampling all entities with batch requests
+        """
+
+        queries = []
+        for endpoint in self.entities:
+            if endpoint not in self.client.singleton_entities:
+                where = " WHERE Active IN (true, false)" if endpoint == "Class" else ""
+                queries.append(("{0}-count".format(endpoint), "SELECT COUNT(*) FROM {0}{1}".format(endpoint, where)))
+            queries.append(("{0}-sample".format(endpoint), self.client.offset_query(endpoint, 1, SAMPLE_SIZE)))
+
+        start = time.monotonic()
+        responses = self.client.batch_request(queries)
+        batch_requests = math.ceil(len(queries) / MAX_BATCH_SIZE)
+        self.latencies.extend([(time.monotonic() - start) / batch_requests] * batch_requests)
+
+        for endpoint in self.entities:
+            sample = responses["{0}-sample".format(endpoint)].get(endpoint, [])
+            count = responses.get("{0}-count".format(endpoint), {}).get("totalCount", len(sample))
+
+            if self.client.pagination == "keyset" and endpoint not in self.client.singleton_entities:
+                self.requests += count // PAGE_SIZE + 1
+            else:
+                self.requests += 1 + math.ceil(count / PAGE_SIZE)
+
+            if not sample:
+                continue
+
+            ratio = count / len(sample)
+            self.response_bytes += int(len(json.dumps(sample)) * ratio)
+
+            mapping = Mapping(endpoint=endpoint, data=None)
+            mapping.root_parse(sample)
+            for table, rows in mapping.out_file.items():
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(rows)
+                self.add_table(table, int(len(rows) * ratio), int(len(buffer.getvalue()) * ratio))
+
+    def estimate_report(self, endpoint):
+        """
+        Requesting the report once and estimating its output from the response
+        """
+
+        if not (self.start_date and self.end_date):
+            raise QuickBooksClientException(f"Start date and End date are required for {endpoint} reports.")
+        columns = self.client.report_columns.get(endpoint)
+        urls, _ = self.client.report_urls(endpoint, self.start_date, self.end_date, columns)
+        params = self.report_params.get(endpoint)
+
+        start = time.monotonic()
+        data = self.client._request(urls[0], params)
+        self.latencies.append(time.monotonic() - start)
+
+        size = len(json.dumps(data))
+        self.requests += len(urls)
+        self.response_bytes += size * len(urls)
+
+        if endpoint in REPORTS_CANT_PARSE:
+            # the whole report is output as one JSON cell
+            rows = 1
+        else:
+            value_columns = max(len(ReportMapping.construct_value_columns(data)), 1)
+            rows = self.count_report_rows(data.get("Rows", {}).get("Row", [])) * value_columns
+
+        names = [endpoint] if len(urls) == 1 else ["{0}_accrual".format(endpoint), "{0}_cash".format(endpoint)]
+        for name in names:
+            self.add_table(name, rows, size)
+
+    def count_report_rows(self, rows):
+        """
+        Counting the rows with values within the report sections
+        """
+
+        count = 0
+        for row in rows:
+            if "ColData" in row or "Summary" in row:
+                count += 1
+            if "Rows" in row:
+                count += self.count_report_rows(row["Rows"].get("Row", []))
+        return count
+
+    def add_table(self, table, rows, size):
+        out = self.tables.setdefault(table, {"rows": 0, "bytes": 0})
+        out["rows"] += rows
+        out["bytes"] += size
+
+    @property
+    def runtime(self):
+        """
+        Projected runtime in seconds, limited by the request latency or by the API rate limit
+        """
+
+        latency = sum(self.latencies) / len(self.latencies) if self.latencies else 1
+        return max(self.requests * latency / self.concurrency, self.requests / RATE_LIMIT_PER_MINUTE * 60)
+
+    def to_markdown(self):
+        """
+        Formatting the estimate as a message for the sync action
+        """
+
+        lines = ["| Table | Rows | Size |", "| --- | ---: | ---: |"]
+        for table, out in sorted(self.tables.items()):
+            lines.append("| {0} | {1:,} | {2} |".format(table, out["rows"], self.format_size(out["bytes"])))
+
+        lines.append("")
+        lines.append("**Requests:** {0:,}  ".format(self.requests))
+        lines.append("**Response data:** {0}  ".format(self.format_size(self.response_bytes)))
+        lines.append("**Projected runtime:** {0:.1f} min".format(self.runtime / 60))
+
+        message = "\n".join(lines)
+        logging.info(message)
+        return message
+
+    @staticmethod
+    def format_size(size):
+        for unit in ["B", "kB", "MB"]:
+            if size < 1024:
+                return "{0:.0f} {1}".format(size, unit)
+            size /= 1024
+        return "{0:.1f} GB".format(size)
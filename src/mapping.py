@@ -1,9 +1,12 @@
 import uuid
+import csv
 import pandas as pd
 import json
 import logging
 import sys  # noqa
 import os
+import copy
+import functools
 
 
 # destination to fetch and output files
@@ -12,32 +15,61 @@ DEFAULT_FILE_INPUT = os.path.join(cwd_parent, "data/in/tables/")
 DEFAULT_FILE_DESTINATION = os.path.join(cwd_parent, "data/out/tables/")
 
 
+@functools.lru_cache(maxsize=None)
+def load_mappings():
+    """
+    Loading the mappings of all endpoints, once per process
+    """
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "mappings.json"), "r") as f:
+        return json.load(f)
+
+
 class Mapping:
     """
     Handling Generic Ex Mapping
     """
 
-    def __init__(self, endpoint, data):
+    def __init__(
+        self,
+        endpoint,
+        data,
+        write_always=False,
+        sliced=False,
+        destination=DEFAULT_FILE_DESTINATION,
+        incremental=False,
+    ):
         self.endpoint = endpoint
+        self.destination = os.path.join(destination, "")  # folder of the output tables
+        self.write_always = write_always  # upload the tables even if the job fails
+        self.incremental = incremental  # append the rows to the tables written by a failed run
+        self.sliced = sliced  # output tables as folders of headerless slices
         self.mapping = self.mapping_check(self.endpoint)
         self.out_file = {self.endpoint: []}
         self.out_file_pk = {self.endpoint: []}  # destination name from mapping
         self.out_file_pk_raw = {}  # raw destination name from API output
+        self.out_file_columns = {}  # output columns of every table from mapping
+        self.out_file_index = {}  # position of every output column within the row tuples
+        self.sliced_tables = set()  # tables with at least one slice written
         self.get_primary_key(endpoint, self.mapping)
+        self.get_columns(endpoint, self.mapping)
+        self.out_file_index = {
+            table: {column: position for position, column in enumerate(columns)}
+            for table, columns in self.out_file_columns.items()
+        }
 
         # Runs
-        self.root_parse(data)
-        self.output()
+        # Without data, pages are passed to root_parse() and output() is called by the caller
+        if data is not None:
+            self.root_parse(data)
+            self.output()
 
     @staticmethod
     def mapping_check(endpoint):
         """
         Selecting the Right Mapping for the specified endpoint
+        The mapping is copied as parsing injects the parent table keys into it
         """
-        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "mappings.json"), "r") as f:
-            out = json.load(f)
-        f.close()
-        return out[endpoint]
+        return copy.deepcopy(load_mappings()[endpoint])
 
     def root_parse(self, data):
         """
@@ -51,6 +83,14 @@ class Mapping:
             # Looping row by row
             self.parsing(self.endpoint, mapping, row)
 
+    def write_page(self, data):
+        """
+        Parsing a page of records, with sliced output the rows of the page are written as a new slice
+        """
+        self.root_parse(data)
+        if self.sliced:
+            self.flush()
+
     def parsing(self, table_name, mapping, data):
         """
         Outputting data results based on configured mapping
@@ -61,7 +101,9 @@ class Mapping:
         if table_name not in self.out_file:
             self.out_file[table_name] = []
 
-        row_out = {}  # Storing row output
+        # Storing row output as a tuple aligned with the output columns of the table
+        column_index = self.out_file_index[table_name]
+        row_out = [""] * len(column_index)
 
         # Looping through the keys of the mapping
         for column in mapping:
@@ -140,12 +182,10 @@ class Mapping:
                 value = mapping[column]["value"]
 
             # Injecting new table elements for the row
-            row_out[header] = value
+            row_out[column_index[header]] = value
 
         # Storing JSON tables
-        out_file = self.out_file
-        out_file[table_name].append(row_out)
-        self.out_file = out_file
+        self.out_file[table_name].append(tuple(row_out))
 
     def _parse_table(self, table_name, mapping, data):
         """
@@ -186,13 +226,34 @@ class Mapping:
                 # Recursively run the tableMapping
                 self.get_primary_key(table_name=mapping[column]["destination"], mapping=mapping[column]["tableMapping"])
 
-    @staticmethod
-    def produce_manifest(file_name, primary_key):
+    def get_columns(self, table_name, mapping, sub_table=False):
+        """
+        Constructing the output columns of the table and its nested tables from the mapping
+        """
+
+        columns = []
+        for column in mapping:
+            if mapping[column]["type"] == "column":
+                columns.append(mapping[column]["mapping"]["destination"])
+
+            elif mapping[column]["type"] == "table":
+                columns.append(column)
+                self.get_columns(
+                    table_name=mapping[column]["destination"], mapping=mapping[column]["tableMapping"], sub_table=True
+                )
+
+        # Primary key of the parent table is injected into the nested table rows while parsing
+        if sub_table:
+            columns.append("parent_table")
+
+        self.out_file_columns[table_name] = list(dict.fromkeys(columns))
+
+    def produce_manifest(self, file_name, primary_key, write_always=False, columns=None, incremental=False):
         """
         Dummy function to return header per file type.
         """
 
-        file = "/data/out/tables/" + str(file_name) + ".manifest"
+        file = self.destination + str(file_name) + ".manifest"
         logging.info("Manifest output: {0}".format(file))
 
         manifest_template = {
@@ -209,6 +270,12 @@ class Mapping:
 
         manifest = manifest_template
         # manifest["primary_key"] = primary_key
+        if incremental:
+            manifest["incremental"] = True
+        if write_always:
+            manifest["write_always"] = True
+        if columns:
+            manifest["columns"] = columns
 
         try:
             with open(file, "w") as file_out:
@@ -226,14 +293,57 @@ class Mapping:
         Output Data with its desired file name
         """
 
+        if self.sliced:
+            self.flush()
+            for file in self.sliced_tables:
+                logging.info("Table output: {0}...".format(self.destination + file + ".csv"))
+                self.produce_manifest(
+                    file + ".csv",
+                    self.out_file_pk.get(file, []),
+                    write_always=self.write_always,
+                    columns=self.out_file_columns[file],
+                    incremental=self.incremental,
+                )
+            return
+
         # Outputting files
         out_file = self.out_file
 
         for file in out_file:
-            out_df = pd.DataFrame(out_file[file])
-            file_dest = DEFAULT_FILE_DESTINATION + file + ".csv"
+            if out_file[file]:
+                out_df = pd.DataFrame.from_records(out_file[file], columns=self.out_file_columns[file])
+            else:
+                out_df = pd.DataFrame()
+            file_dest = self.destination + file + ".csv"
             out_df.to_csv(file_dest, index=False)
             logging.info("Table output: {0}...".format(file_dest))
+            if self.write_always or self.incremental:
+                self.produce_manifest(
+                    file + ".csv",
+                    self.out_file_pk.get(file, []),
+                    write_always=self.write_always,
+                    incremental=self.incremental,
+                )
 
         # Outputting manifest file if incremental
         out_file_pk = self.out_file_pk  # noqa
+
+    def flush(self):
+        """
+        Output the rows parsed so far as a new headerless slice of every table
+        Only used for sliced output, the columns are listed in the manifest
+        """
+
+        for file, rows in self.out_file.items():
+            if not rows:
+                continue
+
+            folder = self.destination + file + ".csv"
+            os.makedirs(folder, exist_ok=True)
+            file_dest = os.path.join(folder, "part_{0}.csv".format(uuid.uuid4().hex))
+            with open(file_dest, "w", newline="") as file_out:
+                csv.writer(file_out).writerows(rows)
+
+            self.sliced_tables.add(file)
+
+        self.out_file = {file: [] for file in self.out_file}
@@ -0,0 +1,53 @@
+import logging
+
+# QuickBooks Online returns at most 1000 records per query
+MAX_PAGE_SIZE = 1000
+MIN_PAGE_SIZE = 50
+# Page sizes converge to responses of this size
+TARGET_RESPONSE_BYTES = 4 * 1024 * 1024
+# Full pages answered slower than this are shrunk proportionally
+TARGET_RESPONSE_SECONDS = 20
+
+
+class PageSizeController:
+    """
+    Choosing the page size of every entity from the observed responses
+    Pages of narrow entities are kept at the maximum size, pages of wide entities are sized to about
+    TARGET_RESPONSE_BYTES and shrunk further when they are answered slowly. The page sizes chosen by
+    the previous run are used for the first page of every entity.
+    """
+
+    def __init__(self, sizes=None):
+        self.sizes = dict(sizes or {})  # {endpoint: page size}
+        self.observed = {}  # {endpoint: [records, response bytes]} of the pages fetched by this run
+        self.latency_limits = {}  # {endpoint: page size} limited by slow responses within this run
+
+    def get(self, endpoint):
+        """
+        Page size of the next page of the entity
+        """
+        return self.sizes.get(endpoint, MAX_PAGE_SIZE)
+
+    def observe(self, endpoint, page_size, records, response_bytes, seconds):
+        """
+        Updating the page size of the entity with a fetched page, returns the page size of the next page
+        page_size - requested number of records, only full pages tell the latency of the page size
+        """
+        if not records:
+            return self.get(endpoint)
+
+        observed = self.observed.setdefault(endpoint, [0, 0])
+        observed[0] += records
+        observed[1] += response_bytes
+        size = TARGET_RESPONSE_BYTES * observed[0] / max(observed[1], 1)
+
+        if records == page_size and seconds > TARGET_RESPONSE_SECONDS:
+            limit = page_size * TARGET_RESPONSE_SECONDS / seconds
+            self.latency_limits[endpoint] = min(limit, self.latency_limits.get(endpoint, MAX_PAGE_SIZE))
+        size = min(size, self.latency_limits.get(endpoint, MAX_PAGE_SIZE))
+
+        size = int(min(max(size, MIN_PAGE_SIZE), MAX_PAGE_SIZE))
+        if size != self.get(endpoint):
+            logging.info("Page size of {0} set to {1}".format(endpoint, size))
+        self.sizes[endpoint] = size
+        return size
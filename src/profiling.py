@@ -0,0 +1,78 @@
+import os
+import io
+import json
+import logging
+import cProfile
+import pstats
+import tracemalloc
+
+# number of functions and allocation sites in the reports
+TOP_FUNCTIONS = 20
+TOP_ALLOCATIONS = 25
+
+
+class Profiler:
+    """
+    Profiling a block of code with cProfile and tracemalloc
+    Outputs <name>.prof with the profile stats, <name>_profile.txt with the hot functions
+    and <name>_allocations.txt with the top allocation sites as files.
+    """
+
+    def __init__(self, name, destination):
+        self.name = name
+        self.destination = destination
+        self.profile = None
+        self.started_tracemalloc = False
+
+    def __enter__(self):
+        logging.info("Profiling {0}...".format(self.name))
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+
+        try:
+            self.output(snapshot)
+        except Exception as e:
+            # profiling must never fail the extraction
+            logging.warning("Could not output profile of {0}: {1}".format(self.name, e))
+
+    def output(self, snapshot):
+        os.makedirs(self.destination, exist_ok=True)
+
+        profile_file = "{0}.prof".format(self.name)
+        self.profile.dump_stats(os.path.join(self.destination, profile_file))
+
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+        hot_functions = stream.getvalue()
+        logging.info("Hot functions of {0}:\n{1}".format(self.name, hot_functions))
+
+        allocations = snapshot.filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ]
+        ).statistics("lineno")
+        allocations_text = "\n".join(str(stat) for stat in allocations[:TOP_ALLOCATIONS])
+
+        outputs = {
+            "{0}_profile.txt".format(self.name): hot_functions,
+            "{0}_allocations.txt".format(self.name): allocations_text,
+        }
+        for file_name, text in outputs.items():
+            with open(os.path.join(self.destination, file_name), "w") as file_out:
+                file_out.write(text)
+
+        for file_name in [profile_file, *outputs]:
+            with open(os.path.join(self.destination, file_name + ".manifest"), "w") as file_out:
+                json.dump({"is_permanent": False, "tags": ["quickbooks", "profiling"]}, file_out)
@@ -0,0 +1,50 @@
+import os
+import gzip
+import json
+import logging
+
+# destination to output files
+cwd_parent = os.path.dirname(os.getcwd())
+DEFAULT_FILE_DESTINATION = os.path.join(cwd_parent, "data/out/files/")
+
+# Records parsed from API responses cannot contain reference cycles, the check is skipped
+encoder = json.JSONEncoder(separators=(",", ":"), check_circular=False)
+
+
+class NdjsonWriter:
+    """
+    Writing API records as newline delimited JSON without flattening
+    Every entity record or report response is written as one line of the output file. The records are
+    serialized again from the parsed responses, the Ids of the parsed records are needed for de-duplication
+    and for the pagination position, so the response bytes cannot be written as they are.
+    """
+
+    def __init__(self, file_name, compress=False, tags=None, destination=DEFAULT_FILE_DESTINATION):
+        self.file_name = file_name + (".ndjson.gz" if compress else ".ndjson")
+        self.destination = os.path.join(destination, "")  # folder of the output files
+        self.tags = tags or []
+        self.records = 0
+
+        path = self.destination + self.file_name
+        if compress:
+            self.file = gzip.open(path, "wt", encoding="utf-8", compresslevel=6)
+        else:
+            self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, records):
+        """
+        Writing a page of records, one line per record
+        """
+        self.file.write("".join(encoder.encode(record) + "\n" for record in records))
+        self.records += len(records)
+
+    def close(self):
+        """
+        Closing the file and producing its manifest
+        """
+        self.file.close()
+        logging.info("File output: {0} ({1} records)".format(self.file_name, self.records))
+
+        manifest = {"is_permanent": False, "tags": self.tags}
+        with open(self.destination + self.file_name + ".manifest", "w") as file_out:
+            json.dump(manifest, file_out)
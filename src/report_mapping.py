@@ -4,36 +4,55 @@ import csv
 import json
 import pandas as pd
 import copy
+import uuid
 
 # destination to fetch and output files
 cwd_parent = os.path.dirname(os.getcwd())
 DEFAULT_FILE_INPUT = os.path.join(cwd_parent, "data/in/tables/")
 DEFAULT_FILE_DESTINATION = os.path.join(cwd_parent, "data/out/tables/")
 
+# Reports which cannot be parsed generically, the JSON of the report is output as one cell
+REPORTS_CANT_PARSE = ["CashFlow", "ProfitAndLossDetail", "TransactionList", "GeneralLedger", "TrialBalance"]
+
 
 class ReportMapping:
     """
     Parser dedicated for Report endpoint
     """
 
-    def __init__(self, endpoint, data, query="", accounting_type=""):
+    def __init__(
+        self,
+        endpoint,
+        data,
+        query="",
+        accounting_type="",
+        write_always=False,
+        sliced=False,
+        destination=DEFAULT_FILE_DESTINATION,
+    ):
         # Parameters
         self.endpoint = endpoint
+        self.destination = os.path.join(destination, "")  # folder of the output tables
         self.data = data
         self.header = self.construct_header(data)
         self.columns = ["ReportName", "StartPeriod", "EndPeriod"]
         self.primary_key = ["ReportName", "StartPeriod", "EndPeriod"]
         self.query = query
         self.accounting_type = accounting_type
+        self.write_always = write_always  # upload the table even if the job fails
+        self.sliced = sliced  # output the table as a folder of headerless slices
+        # Titles of the report value columns when the report is summarized by Month, Quarter, Class, ...
+        self.value_columns = self.construct_value_columns(data)
         # Output
         self.data_out = []
 
         # Run
-        report_cant_parse = ["CashFlow", "ProfitAndLossDetail", "TransactionList", "GeneralLedger", "TrialBalance"]
-
-        if endpoint not in report_cant_parse:
+        if endpoint not in REPORTS_CANT_PARSE:
             try:
                 self.itr = 1
+                if self.value_columns:
+                    self.columns.append("ColumnTitle")
+                    self.primary_key.append("ColumnTitle")
                 self.data_out = self.parse(data["Rows"]["Row"], self.header, self.itr)
                 self.columns = self.arrange_header(self.columns)
                 self.output(self.endpoint, self.data_out, self.primary_key)
@@ -76,6 +95,46 @@ class ReportMapping:
 
         return json_out
 
+    @staticmethod
+    def construct_value_columns(data):
+        """
+        Constructing the titles of the value columns for reports with multiple value columns
+        (e.g. requested with summarize_column_by). Returns empty list for single value reports.
+        """
+
+        columns = data.get("Columns", {}).get("Column", [])[1:]
+        if len(columns) < 2:
+            return []
+
+        titles = []
+        for column in columns:
+            title = column.get("ColTitle")
+            if not title:
+                col_keys = [m.get("Value") for m in column.get("MetaData", []) if m.get("Name") == "ColKey"]
+                title = col_keys[0] if col_keys else ""
+            titles.append(title)
+
+        return titles
+
+    def expand_values(self, row, col_data):
+        """
+        Assigning the values of ColData to the row
+        Reports with multiple value columns are output in long format, one row per value column
+        """
+
+        if not self.value_columns:
+            row["value"] = col_data[1]["value"]
+            return [row]
+
+        rows_out = []
+        for title, col in zip(self.value_columns, col_data[1:]):
+            temp_row = dict(row)
+            temp_row["ColumnTitle"] = title
+            temp_row["value"] = col["value"]
+            rows_out.append(temp_row)
+
+        return rows_out
+
     @staticmethod
     def arrange_header(columns):
         """
@@ -116,8 +175,7 @@ class ReportMapping:
                     temp_out = []
                     row[row_name] = i["group"]
                     row["Col_{0}".format(itr + 1)] = i["ColData"][0]["value"]
-                    row["value"] = i["ColData"][1]["value"]
-                    temp_out = [row]
+                    temp_out = self.expand_values(row, i["ColData"])
                     data_out = data_out + temp_out
 
                 elif i["type"] == "Section":
@@ -137,8 +195,7 @@ class ReportMapping:
 
                         # Row value , assuming no more recursion
                         row["Col_{0}".format(itr + 1)] = i["Summary"]["ColData"][0]["value"]
-                        row["value"] = i["Summary"]["ColData"][1]["value"]
-                        temp_out = [row]
+                        temp_out = self.expand_values(row, i["Summary"]["ColData"])
 
                         if "Col_{0}".format(itr + 1) not in self.columns:
                             self.columns.append("Col_{0}".format(itr + 1))
@@ -155,9 +212,8 @@ class ReportMapping:
                     row_value = "value"
                     if row_value not in self.columns:
                         self.columns.append(row_value)
-                    temp_row[row_value] = i["ColData"][1]["value"]
 
-                    data_out.append(temp_row)
+                    data_out.extend(self.expand_values(temp_row, i["ColData"]))
 
                 else:
                     raise Exception("No type found within the row. Please validate the data.")
@@ -167,18 +223,21 @@ class ReportMapping:
         except (KeyError, ValueError) as e:
             logging.warning(f"Parsing error - {type(e).__name__} occurred. Details: {e}")
 
-    @staticmethod
-    def produce_manifest(file_name, primary_key):
+    def produce_manifest(self, file_name, primary_key):
         """
         Dummy function to return header per file type.
         """
 
-        file = DEFAULT_FILE_DESTINATION + str(file_name) + ".manifest"
+        file = self.destination + str(file_name) + ".manifest"
 
         manifest_template = {"incremental": bool(True)}
 
         manifest = manifest_template
         manifest["primary_key"] = primary_key
+        if self.write_always:
+            manifest["write_always"] = True
+        if self.sliced:
+            manifest["columns"] = self.columns
 
         try:
             with open(file, "w") as file_out:
@@ -200,9 +259,12 @@ class ReportMapping:
             filename = "{0}_{1}.csv".format(endpoint, self.accounting_type)
 
         logging.info("Outputting {0}...".format(filename))
-        file_out_path = DEFAULT_FILE_DESTINATION + filename
+        if self.sliced:
+            file_out_path = self.slice_path(filename)
+        else:
+            file_out_path = self.destination + filename
         print(f"Saving file to: {file_out_path}")
-        temp_df.to_csv(file_out_path, index=False, columns=self.columns)
+        temp_df.to_csv(file_out_path, index=False, columns=self.columns, header=not self.sliced)
         self.produce_manifest(filename, pk)
 
     def output_1cell(self, endpoint, columns, data, pk):
@@ -217,14 +279,28 @@ class ReportMapping:
             filename = "{0}_{1}.csv".format(endpoint, self.accounting_type)
 
         # if file exist, not outputing column header
-        if os.path.isfile(DEFAULT_FILE_DESTINATION + filename):
+        if self.sliced:
+            file_out_path = self.slice_path(filename)
+            data_out = [data]
+        elif os.path.isfile(self.destination + filename):
+            file_out_path = self.destination + filename
             data_out = [data]
         else:
+            file_out_path = self.destination + filename
             data_out = [columns, data]
 
-        with open(DEFAULT_FILE_DESTINATION + filename, "a") as f:
+        with open(file_out_path, "a") as f:
             writer = csv.writer(f)
             writer.writerows(data_out)
         f.close()
         logging.info("Outputting {0}... ".format(filename))
         self.produce_manifest(filename, pk)
+
+    def slice_path(self, filename):
+        """
+        Path of a new slice within the sliced table folder
+        """
+
+        folder = self.destination + filename
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, "part_{0}.csv".format(uuid.uuid4().hex))
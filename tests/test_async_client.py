@@ -0,0 +1,57 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import httpx
+
+import async_client
+from async_client import AsyncQuickbooksClient
+from client import QuickBooksClientException
+
+THROTTLED = {"Fault": {"Error": [{"Message": "message=ThrottleExceeded; errorCode=003001", "code": "3001"}]}}
+
+
+class TestThrottling(unittest.TestCase):
+    def request(self, responses):
+        """Sends one query with the responses served in order, returns the result and the number of requests"""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return responses[min(len(calls), len(responses)) - 1]
+
+        async def query():
+            client = AsyncQuickbooksClient(
+                company_id="1",
+                access_token="access",
+                refresh_token="refresh",
+                oauth=SimpleNamespace(appKey="key", appSecret="secret"),
+                sandbox=True,
+            )
+            async with client:
+                await client.http.aclose()
+                client.http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+                return await client._query_async("select * from Invoice")
+
+        with mock.patch.object(async_client, "THROTTLE_BACKOFF_SECONDS", 0.001):
+            return asyncio.run(query()), len(calls)
+
+    def test_throttled_request_is_retried(self):
+        ok = httpx.Response(200, json={"QueryResponse": {"Invoice": [{"Id": "1"}]}})
+        results, calls = self.request([httpx.Response(429, json=THROTTLED), httpx.Response(429, text="Too Many"), ok])
+        self.assertEqual(results, {"Invoice": [{"Id": "1"}]})
+        self.assertEqual(calls, 3)
+
+    def test_retry_after_header_pauses_requests(self):
+        client = AsyncQuickbooksClient("1", "access", "refresh", SimpleNamespace(appKey="k", appSecret="s"), True)
+        client.throttle(httpx.Response(429, headers={"Retry-After": "30"}), attempt=1)
+        self.assertGreater(client.throttled_until - async_client.time.monotonic(), 29)
+
+    def test_throttling_fails_after_retries(self):
+        with self.assertRaises(QuickBooksClientException):
+            self.request([httpx.Response(429, json=THROTTLED)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+import csv
+import json
+import os
+import tempfile
+import threading
+import unittest
+import urllib.parse as url_parse
+from unittest import mock
+
+from client import QuickbooksClient
+from component import Component, run_job
+from mapping import Mapping
+
+INVOICES = [{"Id": str(i), "DocNumber": str(i), "Line": [{"Id": "1", "Amount": i}]} for i in range(1, 2501)]
+
+
+def fake_request(fail_at=None, invoices=INVOICES):
+    """Returns a fake QuickbooksClient._request serving the invoices and failing on the fail_at-th call"""
+    calls = []
+
+    def request(self, url, params=None, payload=None, stats=None):
+        calls.append(url)
+        if fail_at and len(calls) == fail_at:
+            raise ConnectionError("Connection reset by peer")
+
+        query = url_parse.unquote_plus(url.split("query=")[1])
+        if query.lower().startswith("select count(*)"):
+            return {"QueryResponse": {"totalCount": len(invoices)}}
+        startposition = int(query.split("STARTPOSITION ")[1].split(" ")[0])
+        maxresults = int(query.split("MAXRESULTS ")[1])
+        return {"QueryResponse": {"Invoice": invoices[startposition - 1:startposition - 1 + maxresults]}}
+
+    return request
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.saved_states = []
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_data_folder(self, name, state, extraction_settings=None, destination=None):
+        data_folder = os.path.join(self.temp_dir.name, name)
+        for folder in ["in/tables", "in/files", "out/tables", "out/files"]:
+            os.makedirs(os.path.join(data_folder, folder))
+
+        config = {
+            "parameters": {
+                "companyid": "1",
+                "endpoints": ["Invoice"],
+                "reports": [],
+                "destination": {"load_type": "incremental_load", **(destination or {})},
+                "extraction_settings": {"checkpointing": True, **(extraction_settings or {})},
+            },
+            "authorization": {
+                "oauth_api": {
+                    "credentials": {
+                        "appKey": "key",
+                        "#appSecret": "secret",
+                        "created": "2024-01-01T00:00:00+00:00",
+                        "#data": json.dumps({"refresh_token": "refresh", "access_token": "access"}),
+                    }
+                }
+            },
+        }
+        with open(os.path.join(data_folder, "config.json"), "w") as file_out:
+            json.dump(config, file_out)
+        with open(os.path.join(data_folder, "in/state.json"), "w") as file_out:
+            json.dump(state, file_out)
+        return data_folder
+
+    def run_component(self, data_folder, fail_at=None, worker=False, invoices=INVOICES):
+        def update_config_state(component, component_id, configurationId, state, branch_id="default"):
+            self.saved_states.append(state)
+
+        with mock.patch.object(QuickbooksClient, "_request", fake_request(fail_at, invoices)), mock.patch.object(
+            QuickbooksClient, "refresh_access_token", lambda client: None
+        ), mock.patch.object(Component, "update_config_state", update_config_state), mock.patch.object(
+            Component, "encrypt", lambda component, token: token
+        ):
+            if worker:
+                return run_job(data_folder)
+            Component(data_path_override=data_folder).execute_action()
+
+    @staticmethod
+    def read_state(data_folder):
+        with open(os.path.join(data_folder, "out/state.json")) as file_in:
+            return json.load(file_in)
+
+    @staticmethod
+    def read_output(data_folder, table):
+        path = os.path.join(data_folder, "out/tables", table)
+        with open(path) as file_in:
+            ids = [int(row["ID"]) for row in csv.DictReader(file_in)]
+        with open(path + ".manifest") as file_in:
+            return ids, json.load(file_in)
+
+    def test_resumed_entity_is_appended(self):
+        # count, page 1 and failure on page 2
+        failed_run = self.create_data_folder("failed", {})
+        with self.assertRaises(ConnectionError):
+            self.run_component(failed_run, fail_at=3)
+
+        ids, manifest = self.read_output(failed_run, "Invoice.csv")
+        self.assertEqual(ids, list(range(1, 1001)))
+        self.assertTrue(manifest["write_always"])
+        self.assertNotIn("incremental", manifest)
+
+        checkpoint = self.saved_states[-1]["component"]["checkpoint"]
+        self.assertEqual(checkpoint["entity"], {"endpoint": "Invoice", "position": {"startposition": 1001}})
+
+        resumed_run = self.create_data_folder("resumed", self.saved_states[-1]["component"])
+        self.run_component(resumed_run)
+
+        ids, manifest = self.read_output(resumed_run, "Invoice.csv")
+        self.assertEqual(ids, list(range(1001, 2501)))
+        self.assertTrue(manifest["incremental"])
+        self.assertNotIn("primary_key", manifest)
+
+        with open(os.path.join(resumed_run, "out/tables/Invoice-Line.csv.manifest")) as file_in:
+            manifest = json.load(file_in)
+        self.assertTrue(manifest["incremental"])
+
+    def test_worker_jobs_in_a_row_extract_all_endpoints(self):
+        first_job = self.create_data_folder("first", {})
+        self.assertTrue(self.run_component(first_job, worker=True))
+        state = self.read_state(first_job)
+        self.assertNotIn("checkpoint", state)
+
+        # the job source passes the state of the job on to the next job of the configuration
+        second_job = self.create_data_folder("second", state)
+        self.assertTrue(self.run_component(second_job, worker=True))
+        ids, manifest = self.read_output(second_job, "Invoice.csv")
+        self.assertEqual(ids, list(range(1, 2501)))
+        # entities which are not resumed replace the table
+        self.assertNotIn("incremental", manifest)
+        self.assertNotIn("checkpoint", self.read_state(second_job))
+        self.assertEqual(self.saved_states, [])
+
+    def test_failed_worker_job_keeps_checkpoint_in_state_file(self):
+        failed_job = self.create_data_folder("failed", {})
+        self.assertFalse(self.run_component(failed_job, fail_at=3, worker=True))
+        state = self.read_state(failed_job)
+        self.assertEqual(state["checkpoint"]["entity"], {"endpoint": "Invoice", "position": {"startposition": 1001}})
+
+        resumed_job = self.create_data_folder("resumed", state)
+        self.assertTrue(self.run_component(resumed_job, worker=True))
+        ids, _ = self.read_output(resumed_job, "Invoice.csv")
+        self.assertEqual(ids, list(range(1001, 2501)))
+        self.assertNotIn("checkpoint", self.read_state(resumed_job))
+
+    def test_failed_pipelined_output_stops_fetching(self):
+        data_folder = self.create_data_folder("pipelined", {}, {"pipeline": True})
+        invoices = [{"Id": str(i), "DocNumber": str(i)} for i in range(1, 20001)]
+
+        with mock.patch.object(Mapping, "root_parse", side_effect=ValueError("Cannot parse")):
+            with self.assertRaises(ValueError):
+                self.run_component(data_folder, invoices=invoices)
+
+        self.assertFalse([thread for thread in threading.enumerate() if thread.name == "quickbooks-fetch"])
+
+    def test_sliced_table_is_written_per_page(self):
+        data_folder = self.create_data_folder("sliced", {}, destination={"sliced_output": True})
+        self.run_component(data_folder)
+
+        folder = os.path.join(data_folder, "out/tables/Invoice.csv")
+        slices = sorted(os.listdir(folder))
+        self.assertEqual(len(slices), 3)
+        ids = []
+        for name in slices:
+            with open(os.path.join(folder, name)) as file_in:
+                ids.extend(int(row[0]) for row in csv.reader(file_in))
+        self.assertEqual(sorted(ids), list(range(1, 2501)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import datetime
+import unittest
+from types import SimpleNamespace
+
+from client import QuickbooksClient
+
+REPORT_URL = "https://quickbooks.api.intuit.com/v3/company/1/reports/ProfitAndLoss"
+REPORT = {"Header": {"ReportName": "ProfitAndLoss"}}
+
+
+def create_client():
+    return QuickbooksClient("1", "access", "refresh", SimpleNamespace(appKey="key", appSecret="secret"), False)
+
+
+class TestKeysetQuery(unittest.TestCase):
+    def test_first_page(self):
+        self.assertEqual(
+            QuickbooksClient.keyset_query("Invoice", None, 1000), "SELECT * FROM Invoice ORDERBY Id MAXRESULTS 1000"
+        )
+
+    def test_page_after_last_id(self):
+        self.assertEqual(
+            QuickbooksClient.keyset_query("Invoice", "150", 500),
+            "SELECT * FROM Invoice WHERE Id > '150' ORDERBY Id MAXRESULTS 500",
+        )
+
+    def test_class_includes_inactive_records(self):
+        self.assertEqual(
+            QuickbooksClient.keyset_query("Class", None, 1000),
+            "SELECT * FROM Class WHERE Active IN (true, false) ORDERBY Id MAXRESULTS 1000",
+        )
+        self.assertEqual(
+            QuickbooksClient.keyset_query("Class", "7", 1000),
+            "SELECT * FROM Class WHERE Active IN (true, false) AND Id > '7' ORDERBY Id MAXRESULTS 1000",
+        )
+
+
+class TestReportCache(unittest.TestCase):
+    def setUp(self):
+        self.client = create_client()
+        self.client.book_close_date = "2024-06-30"
+
+    def cache(self, end_date, ttl_hours, cache=None):
+        """Caches the report with a new client, returns the client of the next run with the cache"""
+        self.client.enable_report_cache(cache or {}, ttl_hours)
+        _, key = self.client.get_cached_report(REPORT_URL, None, end_date)
+        self.client.cache_report(key, end_date, REPORT)
+
+        client = create_client()
+        client.book_close_date = self.client.book_close_date
+        client.enable_report_cache(self.client.get_report_cache(), ttl_hours)
+        return client
+
+    def test_closed_period_is_reused_without_ttl(self):
+        client = self.cache("2024-03-31", 0)
+        self.assertEqual(client.get_cached_report(REPORT_URL, None, "2024-03-31")[0], REPORT)
+
+    def test_open_period_is_not_cached_without_ttl(self):
+        client = self.cache("2024-07-31", 0)
+        self.assertEqual(client.report_cache, {})
+        self.assertIsNone(client.get_cached_report(REPORT_URL, None, "2024-07-31")[0])
+
+    def test_open_period_is_reused_within_ttl(self):
+        client = self.cache("2024-07-31", 1)
+        self.assertEqual(client.get_cached_report(REPORT_URL, None, "2024-07-31")[0], REPORT)
+
+    def test_open_period_expires_after_ttl(self):
+        client = self.cache("2024-07-31", 1)
+        expired = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=2)
+        for entry in client.report_cache.values():
+            entry["ts"] = expired.isoformat()
+        self.assertIsNone(client.get_cached_report(REPORT_URL, None, "2024-07-31")[0])
+
+    def test_closed_period_expires_when_books_are_reopened(self):
+        client = self.cache("2024-03-31", 0)
+        client.book_close_date = "2024-01-31"
+        self.assertIsNone(client.get_cached_report(REPORT_URL, None, "2024-03-31")[0])
+
+    def test_unused_entries_are_dropped(self):
+        client = self.cache("2024-03-31", 0, cache={"unused": {"ts": "", "closed": True, "data": ""}})
+        self.assertEqual(len(client.report_cache), 1)
+        self.assertNotIn("unused", client.report_cache)
+
+
+class TestDropDuplicates(unittest.TestCase):
+    def test_records_of_previous_pages_are_dropped(self):
+        client = create_client()
+        first = [{"Id": "1"}, {"Id": "2"}, {"Id": "3"}]
+        # a record deleted during the extraction shifts the next page by one record
+        second = [{"Id": "3"}, {"Id": "4"}]
+
+        self.assertIs(client.drop_duplicates("Invoice", first), first)
+        self.assertEqual(client.drop_duplicates("Invoice", second), [{"Id": "4"}])
+        self.assertEqual(client.duplicates["Invoice"], 1)
+
+    def test_entities_are_deduplicated_separately(self):
+        client = create_client()
+        client.drop_duplicates("Invoice", [{"Id": "1"}])
+        self.assertEqual(client.drop_duplicates("Bill", [{"Id": "1"}]), [{"Id": "1"}])
+
+    def test_records_without_numeric_id(self):
+        client = create_client()
+        client.drop_duplicates("Preferences", [{"Id": "a1"}, {"Name": "no id"}])
+        self.assertEqual(client.drop_duplicates("Preferences", [{"Id": "a1"}, {"Id": "b2"}]), [{"Id": "b2"}])
+
+    def test_seen_ids_are_released(self):
+        client = create_client()
+        client.drop_duplicates("Invoice", [{"Id": "1"}, {"Id": "1"}])
+        client.finish_deduplication("Invoice")
+        self.assertNotIn("Invoice", client.seen_ids)
+        self.assertNotIn("Invoice", client.duplicates)
+
+
+if __name__ == "__main__":
+    unittest.main()
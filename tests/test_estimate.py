@@ -0,0 +1,32 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from client import QuickbooksClient
+from estimate import ExtractionEstimate
+
+ROWS = {"Row": [{"ColData": [{"value": "Row {0}".format(i)}, {"value": "1.00"}]} for i in range(100)]}
+
+
+def report(name):
+    return {"Header": {"ReportName": name}, "Columns": {"Column": []}, "Rows": ROWS}
+
+
+class TestEstimateReport(unittest.TestCase):
+    def estimate(self, endpoint):
+        client = QuickbooksClient("1", "access", "refresh", SimpleNamespace(appKey="k", appSecret="s"), True)
+        with mock.patch.object(QuickbooksClient, "_request", lambda client, url, params=None: report(endpoint)):
+            return ExtractionEstimate(client, [endpoint + "**"], "2024-01-01", "2024-12-31").tables
+
+    def test_parsed_report_rows_are_counted(self):
+        self.assertEqual(self.estimate("ProfitAndLoss")["ProfitAndLoss_accrual"]["rows"], 100)
+
+    def test_report_output_as_one_cell_has_one_row(self):
+        tables = self.estimate("GeneralLedger")
+        self.assertEqual(tables["GeneralLedger_accrual"]["rows"], 1)
+        self.assertEqual(tables["GeneralLedger_cash"]["rows"], 1)
+        self.assertEqual(self.estimate("TransactionList")["TransactionList"]["rows"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+from page_size import PageSizeController, MAX_PAGE_SIZE, MIN_PAGE_SIZE, TARGET_RESPONSE_BYTES
+
+
+class TestPageSizeController(unittest.TestCase):
+    def test_narrow_entity_keeps_maximum_page_size(self):
+        sizes = PageSizeController()
+        self.assertEqual(sizes.observe("Term", 1000, 1000, 500 * 1000, 1), MAX_PAGE_SIZE)
+
+    def test_wide_entity_is_sized_to_target_response(self):
+        sizes = PageSizeController()
+        # 16 kB per record => 256 records per 4 MB response
+        self.assertEqual(sizes.observe("Invoice", 1000, 1000, 16 * 1024 * 1000, 5), 256)
+        self.assertEqual(sizes.get("Invoice"), 256)
+
+    def test_slow_full_page_is_shrunk(self):
+        sizes = PageSizeController()
+        self.assertEqual(sizes.observe("Bill", 1000, 1000, 1000, 40), 500)
+        # the latency limit is kept for the rest of the run even if the next pages are fast
+        self.assertEqual(sizes.observe("Bill", 500, 500, 500, 1), 500)
+
+    def test_slow_partial_page_does_not_limit_page_size(self):
+        sizes = PageSizeController()
+        self.assertEqual(sizes.observe("Bill", 1000, 10, 10, 40), MAX_PAGE_SIZE)
+
+    def test_page_size_is_not_below_minimum(self):
+        sizes = PageSizeController()
+        self.assertEqual(sizes.observe("Invoice", 1000, 10, TARGET_RESPONSE_BYTES, 1), MIN_PAGE_SIZE)
+
+    def test_empty_page_keeps_page_size_of_previous_run(self):
+        sizes = PageSizeController({"Invoice": 300})
+        self.assertEqual(sizes.observe("Invoice", 300, 0, 100, 1), 300)
+
+
+if __name__ == "__main__":
+    unittest.main()
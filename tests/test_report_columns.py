@@ -0,0 +1,28 @@
+import unittest
+
+from keboola.component.exceptions import UserException
+
+from component import Component
+
+
+class TestReportColumns(unittest.TestCase):
+    def test_columns_are_selected_per_report(self):
+        selected = Component.get_report_columns(
+            [
+                {"report": "GeneralLedger**", "columns": ["tx_date", "account_name", "tx_date"]},
+                {"report": "TransactionList", "columns": []},
+            ]
+        )
+        self.assertEqual(selected, {"GeneralLedger": ["tx_date", "account_name"]})
+
+    def test_unsupported_report(self):
+        with self.assertRaisesRegex(UserException, "cannot be selected for the ProfitAndLoss report"):
+            Component.get_report_columns([{"report": "ProfitAndLoss", "columns": ["tx_date"]}])
+
+    def test_unknown_columns(self):
+        with self.assertRaisesRegex(UserException, "Unknown columns of the TransactionList report: amount"):
+            Component.get_report_columns([{"report": "TransactionList", "columns": ["tx_date", "amount"]}])
+
+
+if __name__ == "__main__":
+    unittest.main()
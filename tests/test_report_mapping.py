@@ -0,0 +1,71 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+
+from report_mapping import ReportMapping
+
+HEADER = {"Time": "2024-03-01T00:00:00", "ReportName": "ProfitAndLoss", "StartPeriod": "2024-01-01",
+          "EndPeriod": "2024-02-29"}
+
+
+def summarized_report():
+    """ProfitAndLoss summarized by month with one section of data rows"""
+    return {
+        "Header": HEADER,
+        "Columns": {
+            "Column": [
+                {"ColTitle": "", "ColType": "Account"},
+                {"ColTitle": "Jan 2024", "ColType": "Money"},
+                {"ColTitle": "", "ColType": "Money", "MetaData": [{"Name": "ColKey", "Value": "Feb 2024"}]},
+            ]
+        },
+        "Rows": {
+            "Row": [
+                {
+                    "type": "Section",
+                    "group": "Income",
+                    "Header": {"ColData": [{"value": "Income"}, {"value": ""}, {"value": ""}]},
+                    "Rows": {
+                        "Row": [
+                            {"type": "Data", "ColData": [{"value": "Sales"}, {"value": "10.00"}, {"value": "20.00"}]},
+                            {"type": "Data", "ColData": [{"value": "Fees"}, {"value": "1.00"}, {"value": "2.00"}]},
+                        ]
+                    },
+                }
+            ]
+        },
+    }
+
+
+class TestValueColumns(unittest.TestCase):
+    def test_single_value_report_has_no_value_columns(self):
+        data = {"Columns": {"Column": [{"ColTitle": ""}, {"ColTitle": "Total"}]}}
+        self.assertEqual(ReportMapping.construct_value_columns(data), [])
+
+    def test_value_column_titles_fall_back_to_col_key(self):
+        self.assertEqual(ReportMapping.construct_value_columns(summarized_report()), ["Jan 2024", "Feb 2024"])
+
+    def test_summarized_report_is_output_in_long_format(self):
+        with tempfile.TemporaryDirectory() as destination:
+            ReportMapping(endpoint="ProfitAndLoss", data=summarized_report(), destination=destination)
+            with open(os.path.join(destination, "ProfitAndLoss.csv")) as file_in:
+                rows = [(row["Col_2"], row["ColumnTitle"], row["value"]) for row in csv.DictReader(file_in)]
+            with open(os.path.join(destination, "ProfitAndLoss.csv.manifest")) as file_in:
+                manifest = json.load(file_in)
+
+        self.assertIn("ColumnTitle", manifest["primary_key"])
+        self.assertEqual(
+            rows,
+            [
+                ("Sales", "Jan 2024", "10.00"),
+                ("Sales", "Feb 2024", "20.00"),
+                ("Fees", "Jan 2024", "1.00"),
+                ("Fees", "Feb 2024", "2.00"),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()